@@ -0,0 +1,181 @@
+"""Headless spin and week plan service, an HTTP API and a CLI on top of core.PlanService.
+
+    python api.py serve --port 8080
+    python api.py spin -c "🌾 碳水" -c "🥩 蛋白质" -n 3
+    python api.py week --meals 2 --save
+
+Endpoints (JSON in and out, repeat `category` to pick categories, default all;
+unknown categories are a 400 that lists them):
+
+    GET  /health
+    GET  /categories
+    GET  /spin?category=...&n=1
+    GET  /week?category=...&meals=3        generate without saving
+    POST /week {"categories": [...], "meals": 3}   generate and save in one insert
+
+Storage comes from the environment, see core.storage_from_env. Spins are
+served from the in-memory catalog, storage is only read on refresh.
+"""
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from core import MEAL_TIMES, PlanService, storage_from_env
+from resilience import StorageUnavailable
+
+# upper bound for n on /spin, keeps a single request cheap
+MAX_SPINS = 1000
+
+
+def _int_param(params, name, default):
+    try:
+        return int(params.get(name, [default])[0])
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # keep-alive, clients reuse one connection for many requests; headers and body
+    # go out as separate writes, without TCP_NODELAY each response waits on a delayed ack
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, format, *args):
+        pass  # one line per request costs more than the spin itself
+
+    def _send(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, route):
+        try:
+            status, body = route()
+        except ValueError as e:
+            status, body = 400, {'error': str(e)}
+        except StorageUnavailable as e:
+            status, body = 503, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': str(e)}
+        self._send(status, body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        routes = {
+            '/health': self._health,
+            '/categories': lambda: (200, {'categories': self.service.categories()}),
+            '/spin': lambda: self._spin(params),
+            '/week': lambda: self._week(params.get('category'), _int_param(params, 'meals', 3), save=False),
+        }
+        route = routes.get(url.path)
+        if route is None:
+            self._send(404, {'error': 'not found'})
+            return
+        self._dispatch(route)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send(400, {'error': 'invalid json'})
+            return
+        if urlsplit(self.path).path != '/week':
+            self._send(404, {'error': 'not found'})
+            return
+        self._dispatch(lambda: self._post_week(body))
+
+    def _health(self):
+        catalog, _ = self.service.current()
+        return 200, {'status': 'ok', 'foods': len(catalog),
+                     'degraded': getattr(self.service.storage, 'degraded', False)}
+
+    def _spin(self, params):
+        n = _int_param(params, 'n', 1)
+        if not 1 <= n <= MAX_SPINS:
+            raise ValueError(f"n must be between 1 and {MAX_SPINS}")
+        return 200, {'plans': self.service.spin(params.get('category'), n=n)}
+
+    def _post_week(self, body):
+        if not isinstance(body, dict):
+            raise ValueError("body must be a json object")
+        categories = body.get('categories')
+        if categories is not None and not (
+                isinstance(categories, list) and all(isinstance(c, str) for c in categories)):
+            raise ValueError("categories must be a list of strings")
+        meals = body.get('meals', 3)
+        if not isinstance(meals, int) or isinstance(meals, bool):
+            raise ValueError("meals must be an integer")
+        return self._week(categories, meals, save=True)
+
+    def _week(self, categories, meals, save):
+        rows = self.service.generate_week(categories, meals=meals)
+        if save:
+            rows = self.service.save_week(rows)
+        return 200, {'plans': [
+            {key: row.get(key) for key in ('id', 'plan_date', 'plan_time', 'foods_data')} for row in rows
+        ]}
+
+
+def serve(service, host, port):
+    service.current()  # load before taking traffic
+    handler = type('Handler', (ApiHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"serving on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', default='system')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='run the HTTP API')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+
+    spin_parser = commands.add_parser('spin', help='print spins as json')
+    spin_parser.add_argument('-c', '--category', action='append')
+    spin_parser.add_argument('-n', type=int, default=1)
+
+    week_parser = commands.add_parser('week', help='generate a week plan')
+    week_parser.add_argument('-c', '--category', action='append')
+    week_parser.add_argument('--meals', type=int, choices=sorted(MEAL_TIMES), default=3)
+    week_parser.add_argument('--save', action='store_true', help='store the plans in one insert')
+
+    args = parser.parse_args()
+    storage = storage_from_env()
+    if storage is None:
+        sys.exit("No storage configured, set STORAGE_BACKEND or SUPABASE_URL/SUPABASE_ANON_KEY")
+    service = PlanService(storage, user_id=args.user_id)
+
+    if args.command == 'serve':
+        serve(service, args.host, args.port)
+        return
+    try:
+        if args.command == 'spin':
+            result = service.spin(args.category, n=args.n)
+        else:
+            result = service.generate_week(args.category, meals=args.meals)
+            if args.save:
+                result = service.save_week(result)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
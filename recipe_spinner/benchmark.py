@@ -0,0 +1,195 @@
+"""Benchmarks for the DatabaseManager hot paths and the spin engine.
+
+Runs against FakeSupabase, an in-process stand-in for the supabase client,
+so no project or network is needed. --latency adds a sleep per request to
+make round trip counts show up in the timings.
+
+    python benchmark.py --foods 100 1000 10000 --plans 10 1000 --latency 20
+    python benchmark.py --json > bench.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import receipe_spinner as app
+from catalog import Catalog
+from core import RECENT_PENALTY, RECENT_PLANS_K, plan_from_row
+from fake_supabase import FakeSupabase
+from spin_engine import SpinEngine
+from storage import SupabaseBackend, food_key
+
+CATEGORIES = ['🌾 碳水', '🥩 蛋白质', '🥬 蔬菜', '🍎 水果', '🥛 奶制品', '🥜 坚果']
+
+
+def make_catalog(client, n_foods, n_plans):
+    client.seed('foods', [{
+        'user_id': 'system',
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'food_name': f'食材{i}',
+        'food_key': food_key(CATEGORIES[i % len(CATEGORIES)], f'食材{i}'),
+        'created_at': f'2024-01-01T00:00:{i:09d}'
+    } for i in range(n_foods)])
+    client.seed('week_plans', [{
+        'user_id': 'system',
+        'plan_date': '2024-01-01',
+        'plan_time': '12:00',
+        'foods_data': {c: f'食材{random.randrange(max(n_foods, 1))}' for c in CATEGORIES[:3]},
+        'created_at': f'2024-01-01T00:00:{i:09d}'
+    } for i in range(n_plans)])
+
+
+def render_plans(plans):
+    # same markup tab2 builds per plan, without streamlit itself
+    return [
+        f'<div class="food-item selected-food"><strong>{category}</strong><br>{food}</div>'
+        for plan in plans for category, food in plan['食材'].items()
+    ]
+
+
+def scenarios(db, client):
+    user_ids = ['system', db.user_id]
+
+    def cold_load_sequential():
+        app.invalidate_all_caches()
+        db.load_food_rows()
+        db.load_week_plan_rows()
+        db.count_week_plans()
+
+    def cold_load_concurrent():
+        app.invalidate_all_caches()
+        with ThreadPoolExecutor(max_workers=app.COLD_START_WORKERS) as pool:
+            futures = [pool.submit(load) for load in
+                       (db.load_food_rows, db.load_week_plan_rows, db.count_week_plans)]
+            for future in futures:
+                future.result()
+
+    def batch_add():
+        tag = random.getrandbits(32)
+        db.add_foods_bulk('🥗 沙拉', [f'新食材{tag}-{i}' for i in range(500)])
+
+    def delete_full_reload():
+        row = db.storage.insert_foods([db._food_row('🥗 沙拉', f'待删{random.getrandbits(32)}')])[0]
+        client.reset_counters()
+        db.storage.delete_foods('system', [row['id']])
+        app.invalidate_foods_cache()
+        Catalog(db.load_food_rows())
+
+    def delete_delta():
+        row = db.storage.insert_foods([db._food_row('🥗 沙拉', f'待删{random.getrandbits(32)}')])[0]
+        client.reset_counters()
+        db.storage.delete_foods('system', [row['id']])
+        db.load_foods_since(row['created_at'])
+        db.count_foods()
+
+    def week_plan_render_all():
+        rows = db.storage.select_week_plans('system')
+        render_plans([plan_from_row(item) for item in rows])
+
+    def week_plan_render_page():
+        app.invalidate_week_plans_cache()
+        render_plans(db.load_week_plans())
+
+    catalog = Catalog(db.storage.select_foods(user_ids))
+    plans = [plan_from_row(item) for item in db.storage.select_week_plans('system', limit=RECENT_PLANS_K)]
+
+    def spin_engine_build():
+        SpinEngine(catalog.names, plans, RECENT_PLANS_K, RECENT_PENALTY)
+
+    engine = SpinEngine(catalog.names, plans, RECENT_PLANS_K, RECENT_PENALTY)
+
+    def spin():
+        engine.spin(CATEGORIES[:3], n=app.SPIN_REEL_FRAMES + 1)
+
+    def spin_1000_candidates():
+        engine.spin_best_variety(CATEGORIES[:3], candidates=1000)
+
+    return {
+        'cold_load_sequential': cold_load_sequential,
+        'cold_load_concurrent': cold_load_concurrent,
+        'batch_add_500': batch_add,
+        'delete_full_reload': delete_full_reload,
+        'delete_delta': delete_delta,
+        'week_plan_render_all': week_plan_render_all,
+        'week_plan_render_page': week_plan_render_page,
+        'spin_engine_build': spin_engine_build,
+        'spin': spin,
+        'spin_1000_candidates': spin_1000_candidates,
+    }
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def measure(func, client, repeat):
+    timings = []
+    requests = []
+    for _ in range(repeat):
+        client.reset_counters()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+        requests.append(client.requests)
+
+    # one extra run under tracemalloc, it slows things down too much to time
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'requests': statistics.median(requests),
+        'peak_kb': peak / 1024,
+    }
+
+
+def run(n_foods, n_plans, latency, repeat, only=None):
+    client = FakeSupabase(latency=latency)
+    make_catalog(client, n_foods, n_plans)
+    db = app.DatabaseManager(SupabaseBackend(client), user_id='bench')
+    results = {}
+    for name, func in scenarios(db, client).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, client, repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--foods', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--plans', type=int, nargs='+', default=[10, 1000])
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated ms per request')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', help='scenario names to run')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+
+    report = []
+    for n_foods in args.foods:
+        for n_plans in args.plans:
+            results = run(n_foods, n_plans, args.latency / 1000, args.repeat, args.only)
+            report.append({'foods': n_foods, 'plans': n_plans, 'results': results})
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    for entry in report:
+        print(f"\nfoods={entry['foods']} plans={entry['plans']} latency={args.latency}ms")
+        print(f"{'scenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'requests':>10}{'peak KB':>10}")
+        for name, r in entry['results'].items():
+            print(f"{name:<24}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                  f"{r['requests']:>10.0f}{r['peak_kb']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import bisect
+
+from storage import food_key
+
+
+class FoodItem:
+    __slots__ = ('id', 'category', 'name', 'is_custom', 'key', 'weight')
+
+    def __init__(self, category, name, is_custom=False, food_id=None, weight=1.0):
+        self.id = food_id
+        self.category = category
+        self.name = name
+        self.is_custom = is_custom
+        self.key = food_key(category, name)
+        self.weight = weight  # spin weight, see sql/foods_weight.sql
+
+    @classmethod
+    def from_row(cls, item):
+        weight = item.get('weight')
+        return cls(item['category'], item['food_name'], item['user_id'] != 'system', item.get('id'),
+                   1.0 if weight is None else float(weight))
+
+    def __repr__(self):
+        return f'FoodItem({self.category!r}, {self.name!r}, id={self.id!r})'
+
+
+class Catalog:
+    """The loaded foods, grouped once on load and then updated in place.
+
+    Everything a rerun reads is kept precomputed: per-category items and
+    name lists, the custom foods, counts, sorted categories, an id map, the
+    dedupe keys and the spin weights that aren't 1. add/remove only touch the affected category.
+    Placeholders (id None) are optimistic adds waiting for their stored row.
+    """
+
+    def __init__(self, rows=()):
+        self.by_category = {}
+        self.names = {}
+        self.custom = {}
+        self.categories = []
+        self.by_id = {}
+        self.keys = set()
+        self.weights = {}
+        self.placeholders = []
+        self.system_count = 0
+        self.custom_count = 0
+        for item in rows:
+            self.add(FoodItem.from_row(item))
+
+    def __len__(self):
+        return self.system_count + self.custom_count
+
+    def items(self):
+        return self.by_category.items()
+
+    def get(self, category):
+        return self.by_category.get(category, [])
+
+    def add(self, food):
+        category = food.category
+        if category not in self.by_category:
+            self.by_category[category] = []
+            self.names[category] = []
+            bisect.insort(self.categories, category)
+        self.by_category[category].append(food)
+        self.names[category].append(food.name)
+        self.keys.add(food.key)
+        if food.weight != 1.0:
+            self.weights[(category, food.name)] = food.weight
+        if food.id is None:
+            self.placeholders.append(food)
+        else:
+            self.by_id[food.id] = food
+        if food.is_custom:
+            self.custom.setdefault(category, []).append(food)
+            self.custom_count += 1
+        else:
+            self.system_count += 1
+        return food
+
+    def remove(self, food):
+        category = food.category
+        foods = self.by_category[category]
+        i = foods.index(food)
+        del foods[i]
+        del self.names[category][i]
+        self.keys.discard(food.key)
+        self.weights.pop((category, food.name), None)
+        if food.id is None:
+            self.placeholders.remove(food)
+        else:
+            self.by_id.pop(food.id, None)
+        if food.is_custom:
+            self.custom[category].remove(food)
+            if not self.custom[category]:
+                del self.custom[category]
+            self.custom_count -= 1
+        else:
+            self.system_count -= 1
+        if not foods:
+            del self.by_category[category]
+            del self.names[category]
+            self.categories.remove(category)
+
+    def remove_id(self, food_id):
+        """Drop the food with this id, returns it or None if it isn't loaded"""
+        food = self.by_id.get(food_id)
+        if food is not None:
+            self.remove(food)
+        return food
+
+    def drop_placeholders(self):
+        dropped = list(self.placeholders)
+        for food in dropped:
+            self.remove(food)
+        return dropped
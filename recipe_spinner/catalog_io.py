@@ -0,0 +1,251 @@
+"""Streaming catalog import/export.
+
+Foods are read from CSV (columns category,food_name and an optional
+weight), JSON Lines (one {"category": ..., "food_name": ..., "weight": ...}
+object per line) or a JSON array of them and written in chunks
+through the storage backend's unique-key upsert, so re-running an import or
+resuming it from an earlier checkpoint never creates duplicates.
+Exports page through the tables by key and write rows as they arrive.
+
+    python catalog_io.py import foods.csv
+    python catalog_io.py import foods.jsonl --resume
+    python catalog_io.py export foods foods.csv
+    python catalog_io.py export week_plans plans.jsonl
+    python catalog_io.py migrate-week-plans
+
+migrate-week-plans rewrites week plans stored before the jsonb switch
+(foods_data as a json string, see sql/week_plans_jsonb.sql) as objects.
+
+The backend comes from STORAGE_BACKEND / SQLITE_PATH, or SUPABASE_URL and
+SUPABASE_ANON_KEY for supabase, all read from the environment.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from core import storage_from_env
+from storage import food_key
+
+IMPORT_CHUNK_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+MIGRATE_PAGE_SIZE = 200
+MAX_NAME_LENGTH = 100
+
+FOOD_COLUMNS = ['category', 'food_name', 'weight', 'user_id', 'created_at']
+WEEK_PLAN_COLUMNS = ['plan_date', 'plan_time', 'foods_data', 'created_at']
+
+
+def detect_format(path):
+    # .json files are read as jsonl too, read_food_records spots a top-level array
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _food_record(record):
+    try:
+        return record.get('category'), record.get('food_name'), record.get('weight')
+    except AttributeError:
+        return None, None, None
+
+
+def _parse_weight(weight):
+    """Spin weight from an input record; 1 when missing, None when it isn't a number >= 0"""
+    if weight is None or weight == '':
+        return 1.0
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        return None
+    return weight if weight >= 0 else None
+
+
+def read_food_records(lines, fmt):
+    """Yield (category, food_name, weight) per input record, Nones for records that can't be parsed.
+
+    For jsonl, a file starting with `[` is a plain JSON array and is parsed
+    whole; that can't be streamed, only JSON Lines are read line by line.
+    """
+    if fmt == 'csv':
+        for record in csv.DictReader(lines):
+            yield _food_record(record)
+        return
+    lines = iter(lines)
+    first = True
+    for line in lines:
+        if not line.strip():
+            continue
+        if first and line.lstrip().startswith('['):
+            try:
+                records = json.loads(line + ''.join(lines))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid JSON array: {e}") from e
+            for record in records:
+                yield _food_record(record)
+            return
+        first = False
+        try:
+            yield _food_record(json.loads(line))
+        except json.JSONDecodeError:
+            yield None, None, None
+
+
+def import_foods(storage, records, known_keys=(), user_id='system', start_at=0,
+                 chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate, dedupe and write records in chunks.
+
+    Yields a stats dict after each chunk; stats['processed'] is the number of
+    input records fully handled so far, pass it back as start_at to resume.
+    """
+    stats = {'processed': start_at, 'added': 0, 'duplicate': 0, 'invalid': 0}
+    seen = set(known_keys)
+    chunk = []
+    pending = 0
+
+    def flush():
+        # weight is only sent when the input has one, so backends without the
+        # column (sql/foods_weight.sql) still import plain files
+        if any('weight' in row for row in chunk):
+            for row in chunk:
+                row.setdefault('weight', 1.0)
+        inserted = storage.insert_foods(chunk) if chunk else []
+        stats['added'] += len(inserted)
+        stats['duplicate'] += len(chunk) - len(inserted)
+        stats['processed'] += pending
+        chunk.clear()
+
+    for position, (category, food_name, weight) in enumerate(records):
+        if position < start_at:
+            continue
+        pending += 1
+        category = (category or '').strip()
+        food_name = (food_name or '').strip()
+        parsed_weight = _parse_weight(weight)
+        if not category or not food_name or len(food_name) > MAX_NAME_LENGTH or parsed_weight is None:
+            stats['invalid'] += 1
+        else:
+            key = food_key(category, food_name)
+            if key in seen:
+                stats['duplicate'] += 1
+            else:
+                seen.add(key)
+                row = {
+                    'user_id': user_id,
+                    'category': category,
+                    'food_name': food_name,
+                    'food_key': key,
+                    'created_at': datetime.now().isoformat()
+                }
+                if parsed_weight != 1.0:
+                    row['weight'] = parsed_weight
+                chunk.append(row)
+
+        if len(chunk) >= chunk_size:
+            flush()
+            pending = 0
+            yield dict(stats)
+
+    flush()
+    yield dict(stats)
+
+
+def iter_foods(storage, user_ids=('system',), page_size=EXPORT_PAGE_SIZE):
+    after_id = None
+    while True:
+        rows = storage.select_foods_page(list(user_ids), after_id=after_id, limit=page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1]['id']
+
+
+def iter_week_plans(storage, user_id='system', page_size=EXPORT_PAGE_SIZE):
+    before = None
+    while True:
+        rows = storage.select_week_plans(user_id, before=before, limit=page_size)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        before = (rows[-1]['created_at'], rows[-1]['id'])
+
+
+def write_rows(rows, out, fmt, columns):
+    """Write rows to a text file object as they arrive, returns the row count"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            if isinstance(row.get('foods_data'), dict):
+                row = dict(row, foods_data=json.dumps(row['foods_data'], ensure_ascii=False))
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def export_table(storage, table, out, fmt):
+    if table == 'foods':
+        return write_rows(iter_foods(storage), out, fmt, FOOD_COLUMNS)
+    return write_rows(iter_week_plans(storage), out, fmt, WEEK_PLAN_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='import foods from csv/jsonl')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'], help='jsonl also reads a JSON array')
+    import_parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    import_parser.add_argument('--resume', action='store_true', help='continue from <path>.progress')
+
+    export_parser = commands.add_parser('export', help='export foods or week_plans')
+    export_parser.add_argument('table', choices=['foods', 'week_plans'])
+    export_parser.add_argument('path', help="output file, '-' for stdout")
+    export_parser.add_argument('--format', choices=['csv', 'jsonl'])
+
+    migrate_parser = commands.add_parser('migrate-week-plans', help='rewrite legacy string foods_data as jsonb')
+    migrate_parser.add_argument('--page-size', type=int, default=MIGRATE_PAGE_SIZE)
+
+    args = parser.parse_args()
+    storage = storage_from_env(resilient=False)
+    if storage is None:
+        sys.exit("No storage configured, set STORAGE_BACKEND or SUPABASE_URL/SUPABASE_ANON_KEY")
+
+    if args.command == 'import':
+        checkpoint = args.path + '.progress'
+        start_at = 0
+        if args.resume and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start_at = int(f.read().strip() or 0)
+
+        fmt = args.format or detect_format(args.path)
+        stats = None
+        with open(args.path, newline='', encoding='utf-8-sig') as f:
+            for stats in import_foods(storage, read_food_records(f, fmt), start_at=start_at,
+                                      chunk_size=args.chunk_size):
+                with open(checkpoint, 'w') as progress:
+                    progress.write(str(stats['processed']))
+                print(f"\r{stats['processed']} processed, {stats['added']} added, "
+                      f"{stats['duplicate']} duplicate, {stats['invalid']} invalid", end='', file=sys.stderr)
+        print(file=sys.stderr)
+        os.remove(checkpoint)
+    elif args.command == 'migrate-week-plans':
+        print(f"{storage.migrate_week_plans(args.page_size)} week plans migrated", file=sys.stderr)
+    else:
+        fmt = args.format or detect_format(args.path)
+        if args.path == '-':
+            count = export_table(storage, args.table, sys.stdout, fmt)
+        else:
+            with open(args.path, 'w', newline='', encoding='utf-8') as out:
+                count = export_table(storage, args.table, out, fmt)
+        print(f"{count} rows exported", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Catalog loading, spinning and plan saving without Streamlit.
+
+The app, api.py and scripts share these. PlanService keeps the catalog and
+the spin engine in memory and refreshes them in the background once they
+are older than `ttl`, so serving a spin never waits on storage.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from catalog import Catalog
+from resilience import ResilientStorage
+from storage import create_storage
+
+# foods picked in the last RECENT_PLANS_K plans get their weight scaled by RECENT_PENALTY
+RECENT_PLANS_K = 3
+RECENT_PENALTY = 0.2
+
+# generated week plans: days from today and the meal times per meals-per-day
+WEEK_DAYS = 7
+MEAL_TIMES = {1: ['12:00'], 2: ['12:00', '18:00'], 3: ['08:00', '12:00', '18:00']}
+
+# seconds a PlanService catalog is served before a background refresh
+CATALOG_TTL = 300
+
+
+def plan_from_row(item):
+    foods_data = item['foods_data']
+    # legacy rows hold a json.dumps string, jsonb rows already arrive as a dict
+    if isinstance(foods_data, str):
+        foods_data = json.loads(foods_data)
+    return {
+        'id': item['id'],
+        '日期': item['plan_date'],
+        '时间': item['plan_time'],
+        '食材': foods_data
+    }
+
+
+def week_plan_row(foods_data, plan_date=None, plan_time=None, created_at=None, user_id='system'):
+    return {
+        'user_id': user_id,
+        'plan_date': plan_date or datetime.now().strftime("%Y-%m-%d"),
+        'plan_time': plan_time or datetime.now().strftime("%H:%M"),
+        'foods_data': foods_data,  # jsonb column, see sql/week_plans_jsonb.sql
+        'created_at': created_at or datetime.now().isoformat()
+    }
+
+
+def week_plan_rows(plans, meals, user_id='system'):
+    """Rows for plans generated in day order, meals per day starting today"""
+    today = datetime.now()
+    times = MEAL_TIMES[meals]
+    rows = []
+    for i, foods_data in enumerate(plans):
+        rows.append(week_plan_row(
+            foods_data,
+            plan_date=(today + timedelta(days=i // meals)).strftime("%Y-%m-%d"),
+            plan_time=times[i % meals],
+            # newest first is the display order, so the first meal gets the latest timestamp
+            created_at=(today + timedelta(microseconds=len(plans) - i)).isoformat(),
+            user_id=user_id
+        ))
+    return rows
+
+
+def build_spin_engine(catalog, plans):
+    """plans are plan_from_row dicts, newest first"""
+    # numpy is most of this module's import time, it's loaded with the first engine instead
+    from spin_engine import SpinEngine
+    return SpinEngine(catalog.names, recent_plans=plans, recent_k=RECENT_PLANS_K, recent_penalty=RECENT_PENALTY,
+                      weights=catalog.weights)
+
+
+def supabase_from_env():
+    from supabase import create_client
+    url = os.environ.get('SUPABASE_URL')
+    key = os.environ.get('SUPABASE_ANON_KEY')
+    return create_client(url, key) if url and key else None
+
+
+def storage_from_env(resilient=True):
+    """Backend from STORAGE_BACKEND / SQLITE_PATH, or SUPABASE_URL and SUPABASE_ANON_KEY"""
+    storage = create_storage({}, supabase_factory=supabase_from_env)
+    if storage is not None and resilient:
+        storage = ResilientStorage(storage)
+    return storage
+
+
+class PlanService:
+    """Spins and week plans for one user's catalog, served from memory"""
+
+    def __init__(self, storage, user_id='system', ttl=CATALOG_TTL):
+        self.storage = storage
+        self.user_id = user_id
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.catalog = None
+        self.engine = None
+        self.loaded_at = 0.0
+        self.refreshing = False
+
+    def refresh(self):
+        catalog = Catalog(self.storage.select_foods([self.user_id]))
+        plans = [plan_from_row(item) for item in
+                 self.storage.select_week_plans(self.user_id, limit=RECENT_PLANS_K)]
+        engine = build_spin_engine(catalog, plans)
+        with self.lock:
+            self.catalog, self.engine = catalog, engine
+            self.loaded_at = time.monotonic()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # keep serving the old catalog, the next request tries again
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def current(self):
+        """(catalog, engine); only the very first call waits for storage"""
+        if self.engine is None:
+            self.refresh()
+        elif time.monotonic() - self.loaded_at > self.ttl:
+            with self.lock:
+                start = not self.refreshing
+                self.refreshing = True
+            if start:
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+        return self.catalog, self.engine
+
+    def categories(self):
+        catalog, _ = self.current()
+        return {category: len(catalog.names[category]) for category in catalog.categories}
+
+    def _checked_categories(self, catalog, categories):
+        """All categories when none are given; raises ValueError naming any the catalog doesn't have"""
+        if not categories:
+            return catalog.categories
+        unknown = [category for category in categories if category not in catalog.names]
+        if unknown:
+            raise ValueError(f"unknown categories: {', '.join(unknown)}")
+        return categories
+
+    def spin(self, categories=None, n=1):
+        catalog, engine = self.current()
+        return engine.spin(self._checked_categories(catalog, categories), n=n)
+
+    def generate_week(self, categories=None, meals=3, days=WEEK_DAYS):
+        if meals not in MEAL_TIMES:
+            raise ValueError(f"meals must be one of {sorted(MEAL_TIMES)}")
+        catalog, engine = self.current()
+        plans = engine.spin_week(self._checked_categories(catalog, categories), days=days, meals=meals)
+        return week_plan_rows(plans, meals, user_id=self.user_id)
+
+    def save_week(self, rows):
+        """One multi-row insert, returns the stored rows"""
+        stored = self.storage.insert_week_plans(rows)
+        # the recent-plan penalty should see the new plans
+        self.loaded_at = 0.0
+        return stored
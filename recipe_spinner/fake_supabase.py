@@ -0,0 +1,230 @@
+import copy
+import threading
+import time
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text):
+    # "a.lt.1,and(b.eq.2,c.lt.3)" -> ["a.lt.1", "and(b.eq.2,c.lt.3)"]
+    parts, depth, current, quoted = [], 0, '', False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _coerce(value, like):
+    if isinstance(like, int) and not isinstance(like, bool):
+        return int(value)
+    return value
+
+
+OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+
+def _parse_condition(term):
+    """PostgREST logic-tree syntax, enough for the filters the app sends"""
+    if term.startswith('and(') or term.startswith('or('):
+        combine = all if term.startswith('and(') else any
+        inner = [_parse_condition(t) for t in _split_top_level(term[term.index('(') + 1:-1])]
+        return lambda row: combine(cond(row) for cond in inner)
+
+    column, op, value = term.split('.', 2)
+    value = value.strip('"')
+    return lambda row: row.get(column) is not None and OPERATORS[op](row[column], _coerce(value, row[column]))
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.payload = None
+        self.count_mode = None
+        self.conditions = []
+        self.orders = []
+        self.row_limit = None
+
+    # actions
+    def select(self, columns='*', count=None):
+        self.columns = columns
+        self.count_mode = count
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict='id', ignore_duplicates=False):
+        self.action, self.payload = 'upsert', rows
+        self.on_conflict = on_conflict.split(',')
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    # filters
+    def _filter(self, column, op, value):
+        self.conditions.append(lambda row: row.get(column) is not None and OPERATORS[op](row[column], value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def in_(self, column, values):
+        values = set(values)
+        self.conditions.append(lambda row: row.get(column) in values)
+        return self
+
+    def contains(self, column, value):
+        self.conditions.append(
+            lambda row: isinstance(row.get(column), dict) and all(row[column].get(k) == v for k, v in value.items())
+        )
+        return self
+
+    def or_(self, filters):
+        conditions = [_parse_condition(term) for term in _split_top_level(filters)]
+        self.conditions.append(lambda row: any(cond(row) for cond in conditions))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        return self.client._rpc(self)
+
+
+class FakeSupabase:
+    """In-process stand-in for the supabase client.
+
+    Keeps tables as lists of dicts, counts every request and can sleep
+    `latency` seconds per request to mimic a network round trip.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {'foods': [], 'week_plans': []}
+        self.next_id = {'foods': 1, 'week_plans': 1}
+        self.requests = 0
+        self.request_log = {}
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.request_log = {}
+
+    def seed(self, table, rows):
+        # bypasses the request counter, for building fixtures
+        with self.lock:
+            for row in rows:
+                self._insert_row(table, row)
+
+    def _count_request(self, key):
+        with self.lock:
+            self.requests += 1
+            self.request_log[key] = self.request_log.get(key, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _insert_row(self, table, row):
+        row = dict(row)
+        if row.get('id') is None:
+            row['id'] = self.next_id[table]
+        self.next_id[table] = max(self.next_id[table], row['id'] + 1)
+        self.tables[table].append(row)
+        return row
+
+    def _execute(self, query):
+        self._count_request(f"{query.action} {query.table}")
+        with self.lock:
+            rows = self.tables[query.table]
+            if query.action in ('insert', 'upsert'):
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                if query.action == 'upsert':
+                    conflict_key = lambda row: tuple(row.get(column) for column in query.on_conflict)
+                    incoming = {conflict_key(row) for row in payload}
+                    if query.ignore_duplicates:
+                        existing = {conflict_key(row) for row in rows}
+                        payload = [row for row in payload if conflict_key(row) not in existing]
+                    else:
+                        self.tables[query.table] = [row for row in rows if conflict_key(row) not in incoming]
+                return FakeResponse([copy.deepcopy(self._insert_row(query.table, row)) for row in payload])
+
+            matched = [row for row in rows if all(cond(row) for cond in query.conditions)]
+            if query.action == 'delete':
+                gone = set(map(id, matched))
+                self.tables[query.table] = [row for row in rows if id(row) not in gone]
+                return FakeResponse(copy.deepcopy(matched))
+
+            count = len(matched) if query.count_mode else None
+            for column, desc in reversed(query.orders):
+                matched.sort(key=lambda row: row.get(column) or '', reverse=desc)
+            if query.row_limit is not None:
+                matched = matched[:query.row_limit]
+            return FakeResponse(copy.deepcopy(matched), count)
+
+    def _rpc(self, call):
+        self._count_request(f"rpc {call.name}")
+        if call.name != 'food_pick_count':
+            raise ValueError(f"Unknown rpc: {call.name}")
+        with self.lock:
+            return FakeResponse(sum(
+                1 for row in self.tables['week_plans']
+                if row['user_id'] == call.params.get('p_user_id', 'system')
+                and isinstance(row['foods_data'], dict)
+                and call.params['p_food_name'] in row['foods_data'].values()
+            ))
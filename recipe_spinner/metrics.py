@@ -0,0 +1,169 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# histogram upper bounds in seconds, prometheus style
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# payload bytes are estimated from this many rows spread over the result, not the whole thing
+SIZE_SAMPLE_ROWS = 8
+
+
+class Metric:
+    __slots__ = ('count', 'errors', 'total', 'max', 'rows', 'payload_bytes', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.payload_bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+
+class Metrics:
+    """Process-wide timings for storage calls, DatabaseManager methods and render sections"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.started = time.time()
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.metrics
+
+    def record(self, name, seconds, rows=0, payload_bytes=0, error=False):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric()
+            metric.count += 1
+            metric.errors += int(error)
+            metric.total += seconds
+            metric.max = max(metric.max, seconds)
+            metric.rows += rows
+            metric.payload_bytes += payload_bytes
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    metric.buckets[i] += 1
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, error=error)
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {
+                    'count': m.count,
+                    'errors': m.errors,
+                    'avg_ms': m.total / m.count * 1000 if m.count else 0.0,
+                    'max_ms': m.max * 1000,
+                    'total_ms': m.total * 1000,
+                    'rows': m.rows,
+                    'payload_bytes': m.payload_bytes,
+                }
+                for name, m in sorted(self.metrics.items())
+            }
+
+    def to_json(self):
+        return json.dumps({'since': self.started, 'metrics': self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        lines = [
+            '# TYPE recipe_spinner_call_seconds histogram',
+        ]
+        with self.lock:
+            items = sorted(self.metrics.items())
+            for name, m in items:
+                for bound, n in zip(BUCKETS, m.buckets):
+                    lines.append(f'recipe_spinner_call_seconds_bucket{{name="{name}",le="{bound}"}} {n}')
+                lines.append(f'recipe_spinner_call_seconds_bucket{{name="{name}",le="+Inf"}} {m.count}')
+                lines.append(f'recipe_spinner_call_seconds_sum{{name="{name}"}} {m.total:.6f}')
+                lines.append(f'recipe_spinner_call_seconds_count{{name="{name}"}} {m.count}')
+            for metric, attr in (('errors', 'errors'), ('rows', 'rows'), ('payload_bytes', 'payload_bytes')):
+                lines.append(f'# TYPE recipe_spinner_call_{metric}_total counter')
+                for name, m in items:
+                    lines.append(f'recipe_spinner_call_{metric}_total{{name="{name}"}} {getattr(m, attr)}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def _json_bytes(value):
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode())
+
+
+def _result_size(result):
+    """(rows, estimated payload bytes); serializing a 100k row result just to measure it costs ~1s"""
+    if isinstance(result, dict):
+        return 1, _json_bytes(result)
+    if not isinstance(result, list) or not result:
+        return 0, 0
+    step = max(1, len(result) // SIZE_SAMPLE_ROWS)
+    sample = result[::step][:SIZE_SAMPLE_ROWS]
+    return len(result), _json_bytes(sample) * len(result) // len(sample)
+
+
+class InstrumentedStorage:
+    """Wraps a StorageBackend so every call records time, rows, payload bytes and errors"""
+
+    def __init__(self, storage, metrics=METRICS):
+        self.storage = storage
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self.storage, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                self.metrics.record(f'storage.{name}', time.perf_counter() - start, error=True)
+                raise
+            elapsed = time.perf_counter() - start
+            rows, payload_bytes = _result_size(result)
+            self.metrics.record(f'storage.{name}', elapsed, rows, payload_bytes)
+            return result
+        return call
+
+
+def instrument_methods(prefix, metrics=METRICS):
+    """Class decorator timing every public method as `prefix.method`"""
+    def decorate(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or not callable(func):
+                continue
+            setattr(cls, name, _timed_method(f'{prefix}.{name}', func, metrics))
+        return cls
+    return decorate
+
+
+def _timed_method(name, func, metrics):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.timed(name):
+            return func(*args, **kwargs)
+    return wrapper
@@ -1,12 +1,57 @@
-import streamlit as st
-import random
 import time
-from datetime import datetime, timedelta
-import pandas as pd
-import json
-import os
-from supabase import create_client, Client
+_import_started = time.perf_counter()
+
+import streamlit as st
+from datetime import datetime
 import uuid
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from storage import create_storage, food_key
+from write_behind import WriteBehindQueue
+from search_index import FoodSearchIndex, LayeredSearchIndex
+from catalog import Catalog, FoodItem
+from core import MEAL_TIMES, WEEK_DAYS, build_spin_engine, plan_from_row, week_plan_row, week_plan_rows
+from catalog_io import detect_format, export_table, import_foods, read_food_records
+from metrics import METRICS, InstrumentedStorage, instrument_methods
+from resilience import ResilientStorage
+
+# only the first run in a process pays for the imports, reruns find them in sys.modules.
+# supabase is imported on the warm-up thread, pypinyin on the first search
+if 'startup.import' not in METRICS:
+    METRICS.record('startup.import', time.perf_counter() - _import_started)
+
+# rows per request for bulk lookups/inserts, keeps PostgREST urls and bodies small
+BULK_CHUNK_SIZE = 200
+
+# shared 'system' catalog cache, same rows for every session
+SYSTEM_CACHE_TTL = 300  # seconds
+SYSTEM_CACHE_MAX_ENTRIES = 8
+
+# random names the client-side reel scrolls past before landing on the pick
+SPIN_REEL_FRAMES = 10
+
+# week plans are loaded and rendered one page at a time
+WEEK_PLAN_PAGE_SIZE = 20
+
+# foods rendered per page in the library tab
+LIBRARY_PAGE_SIZE = 200
+
+# results shown under the search box in the add tab
+SEARCH_RESULTS_LIMIT = 20
+
+# independent startup reads run side by side on a small pool
+COLD_START_WORKERS = 3
+
+# storage calls give up after STORAGE_TIMEOUT seconds, reads are retried STORAGE_RETRIES times;
+# BREAKER_FAILURES failures in a row stop calls for BREAKER_COOLDOWN seconds and reads are served stale
+STORAGE_TIMEOUT = 5.0
+STORAGE_RETRIES = 2
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30.0
 
 # Page setup
 st.set_page_config(
@@ -16,23 +61,103 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Config
+# secrets.toml is optional, without it st.secrets raises on any access.
+# secrets win over environment variables with the same name
+def load_config():
+    try:
+        secrets = st.secrets.to_dict()
+    except FileNotFoundError:  # StreamlitSecretNotFoundError subclasses it
+        secrets = {}
+    return {**os.environ, **secrets}
+
 # Supabase setup
-@st.cache_resource
 def init_supabase():
-    SUPABASE_URL = st.secrets.get("SUPABASE_URL", "YOUR_SUPABASE_URL")
-    SUPABASE_KEY = st.secrets.get("SUPABASE_ANON_KEY", "YOUR_SUPABASE_ANON_KEY")
+    config = load_config()
+    SUPABASE_URL = config.get("SUPABASE_URL", "YOUR_SUPABASE_URL")
+    SUPABASE_KEY = config.get("SUPABASE_ANON_KEY", "YOUR_SUPABASE_ANON_KEY")
     
     if SUPABASE_URL == "YOUR_SUPABASE_URL" or SUPABASE_KEY == "YOUR_SUPABASE_ANON_KEY":
-        st.error("Please configure Supabase connection with URL and ANON_KEY")
-        return None
+        raise RuntimeError("Please configure Supabase connection with URL and ANON_KEY")
     
+    # the client stack is slow to import and only needed once the first page is up
+    with METRICS.timed('startup.import.supabase'):
+        from supabase import ClientOptions, create_client
+    with METRICS.timed('startup.connect'):
+        return create_client(
+            SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(postgrest_client_timeout=STORAGE_TIMEOUT)
+        )
+
+# Storage setup
+# STORAGE_BACKEND in secrets (or the environment) picks supabase (default), sqlite or memory. the backend is built
+# and makes its first round trip on a background thread, once per process, while the page renders
+def _warm_up_storage():
+    storage = create_storage(load_config(), supabase_factory=init_supabase)
+    if not storage:
+        return None
+    storage = ResilientStorage(
+        storage,
+        timeout=STORAGE_TIMEOUT,
+        retries=STORAGE_RETRIES,
+        failure_threshold=BREAKER_FAILURES,
+        cooldown=BREAKER_COOLDOWN
+    )
+    try:
+        with METRICS.timed('startup.first_request'):
+            storage.count_foods(['system'])
+    except Exception:
+        pass  # only warming up, the real reads report their own errors
+    # every backend call is timed for the diagnostics panel, retries included
+    return InstrumentedStorage(storage)
+
+@st.cache_resource(show_spinner=False)
+def start_storage_warmup():
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-warm-up')
+    future = pool.submit(_warm_up_storage)
+    pool.shutdown(wait=False)
+    return future
+
+def init_storage():
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        return supabase
+        return start_storage_warmup().result()
     except Exception as e:
-        st.error(f"Supabase connection failed: {e}")
+        # try again on the next run
+        start_storage_warmup.clear()
+        st.error(f"Storage setup failed: {e}")
         return None
 
+# Write-behind queue
+# optional (WRITE_BEHIND = true in secrets): plan saves and food edits are applied to
+# session state right away and written by one background worker per process
+@st.cache_resource
+def init_write_queue(_storage):
+    # a toml bool from secrets, a string from the environment
+    if str(load_config().get("WRITE_BEHIND", False)).lower() not in ('true', '1', 'yes'):
+        return None
+    return WriteBehindQueue(_storage, on_flush=invalidate_all_caches)
+
+# Shared system catalog cache
+# these are cached per process, so concurrent sessions share one fetch.
+# the storage is prefixed with _ so streamlit does not try to hash it
+@st.cache_data(ttl=SYSTEM_CACHE_TTL, max_entries=SYSTEM_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_system_foods(_storage):
+    return _storage.select_foods(['system'])
+
+@st.cache_data(ttl=SYSTEM_CACHE_TTL, max_entries=SYSTEM_CACHE_MAX_ENTRIES, show_spinner=False)
+def fetch_system_week_plans(_storage, before=None, page_size=WEEK_PLAN_PAGE_SIZE):
+    # keyset pagination on (created_at, id), `before` is the key of the last row already loaded
+    return _storage.select_week_plans('system', before=before, limit=page_size)
+
+def invalidate_foods_cache():
+    fetch_system_foods.clear()
+
+def invalidate_week_plans_cache():
+    fetch_system_week_plans.clear()
+
+def invalidate_all_caches():
+    invalidate_foods_cache()
+    invalidate_week_plans_cache()
+
 # TODO
 # Randomized user id for each session
 # this needs to change for scaling
@@ -42,81 +167,105 @@ def get_user_id():
     return st.session_state.user_id
 
 # Database management 
+@instrument_methods('db')
 class DatabaseManager:
-    def __init__(self, supabase_client):
-        self.supabase = supabase_client
-        self.user_id = get_user_id()
+    def __init__(self, storage, write_queue=None, user_id=None):
+        self.storage = storage
+        self.write_queue = write_queue
+        self.user_id = user_id or get_user_id()
     
-    def load_all_foods(self):
-        try:
-            # get 'system' foods and current user foods
-            result = self.supabase.table('foods').select('*').in_(
-                'user_id', ['system', self.user_id]
-            ).execute()
-            
-            foods_by_category = {}
-            
-            for item in result.data:
-                category = item['category']
-                food_name = item['food_name']
-                user_id = item['user_id']
-                
-                if category not in foods_by_category:
-                    foods_by_category[category] = []
-                
-                foods_by_category[category].append({
-                    'name': food_name,
-                    'is_custom': user_id != 'system',
-                    'id': item.get('id')
-                })
-            
-            return foods_by_category
-        except Exception as e:
-            st.error(f"Failed to add food: {e}")
-            return {}
+    def write_status(self):
+        """(pending, failed) queued writes of this session, empty without write-behind"""
+        if not self.write_queue:
+            return [], []
+        return self.write_queue.status(self.user_id)
     
-    def get_categories(self):
-        try:
-            result = self.supabase.table('foods').select('category').execute()
-            categories = list(set(item['category'] for item in result.data))
-            return sorted(categories)
-        except Exception as e:
-            st.error(f"Failed to get categories: {e}")
-            return []
+    def has_pending_writes(self):
+        return bool(self.write_status()[0])
+    
+    def load_food_rows(self):
+        # 'system' foods come from the shared cache, only user foods are fetched per session
+        system_rows = fetch_system_foods(self.storage)
+        user_rows = self.storage.select_foods([self.user_id])
+        return system_rows + user_rows
+    
+    def load_foods_since(self, since):
+        return self.storage.select_foods(['system', self.user_id], since=since)
+    
+    def count_foods(self):
+        return self.storage.count_foods(['system', self.user_id])
     
     def add_food(self, category, food_name):
+        """Add one food in a single request, the caller checks duplicates against the local catalog first"""
+        if self.write_queue:
+            self.write_queue.submit('insert_foods', [self._food_row(category, food_name)], self.user_id)
+            return True, "添加成功"
         try:
-            # check if food already exists
-            existing = self.supabase.table('foods').select('*').eq(
-                'category', category
-            ).eq('food_name', food_name).in_(
-                'user_id', ['system', self.user_id]
-            ).execute()
-            
-            if existing.data:
+            # the unique (user_id, food_key) constraint catches anything the local check missed
+            inserted = self.storage.insert_foods([self._food_row(category, food_name)])
+            if not inserted:
                 return False, "食材已存在"
-            
-            # add new food
-            data = {
-                # TODO
-                # 'user_id': self.user_id,
-                'user_id': 'system',  # currently we are making all user 'system' for single user mode
-                'category': category,
-                'food_name': food_name,
-                'created_at': datetime.now().isoformat()
-            }
-            result = self.supabase.table('foods').insert(data).execute()
+            invalidate_foods_cache()
             return True, "添加成功"
         except Exception as e:
             return False, f"添加失败: {e}"
     
+    def _food_row(self, category, food_name, created_at=None):
+        return {
+            # TODO
+            # 'user_id': self.user_id,
+            'user_id': 'system',  # currently we are making all user 'system' for single user mode
+            'category': category,
+            'food_name': food_name,
+            'food_key': food_key(category, food_name),
+            'created_at': created_at or datetime.now().isoformat()
+        }
+    
+    def add_foods_bulk(self, category, food_names, known_keys=()):
+        """Add many foods to one category, returns [(food_name, 'added'|'duplicate'|'failed')]
+
+        known_keys are food_keys already in the local catalog, those are skipped without a request
+        """
+        results = []
+        new_foods = []
+        seen = set(known_keys)
+        for food in food_names:
+            food = food.strip()
+            if not food:
+                continue
+            key = food_key(category, food)
+            if key in seen:
+                results.append((food, 'duplicate'))
+                continue
+            seen.add(key)
+            new_foods.append(food)
+
+        for start in range(0, len(new_foods), BULK_CHUNK_SIZE):
+            chunk = new_foods[start:start + BULK_CHUNK_SIZE]
+            now = datetime.now().isoformat()
+            rows = [self._food_row(category, food, now) for food in chunk]
+            try:
+                # one upsert per chunk, rows that hit the unique key come back missing
+                inserted = {item['food_name'] for item in self.storage.insert_foods(rows)}
+            except Exception:
+                # only the current chunk is lost, earlier chunks are already written
+                results.extend((food, 'failed') for food in chunk)
+                continue
+            if inserted:
+                invalidate_foods_cache()
+            results.extend((food, 'added' if food in inserted else 'duplicate') for food in chunk)
+        return results
+
     # TODO
-    def delete_food(self, food_id):
-        """Delete food (only those added by user)"""
+    def delete_foods(self, food_ids):
+        """Delete foods (only those added by user), one `in` delete per BULK_CHUNK_SIZE ids"""
+        if self.write_queue:
+            self.write_queue.submit('delete_foods', list(food_ids), self.user_id)
+            return True
         try:
-            result = self.supabase.table('foods').delete().eq(
-                'id', food_id
-            ).eq('user_id', self.user_id).execute()
+            for start in range(0, len(food_ids), BULK_CHUNK_SIZE):
+                self.storage.delete_foods(self.user_id, food_ids[start:start + BULK_CHUNK_SIZE])
+            invalidate_foods_cache()
             return True
         except Exception as e:
             st.error(f"Failed to delete food: {e}")
@@ -126,53 +275,373 @@ class DatabaseManager:
     def clear_user_foods(self):
         """Clear user defined food"""
         try:
-            result = self.supabase.table('foods').delete().eq('user_id', self.user_id).execute()
+            self.storage.delete_foods(self.user_id)
+            invalidate_foods_cache()
             return True
         except Exception as e:
             st.error(f"清空食材失败: {e}")
             return False
     
-    def load_week_plans(self):
+    def load_week_plan_rows(self, before=None, page_size=WEEK_PLAN_PAGE_SIZE):
+        # return self.storage.select_week_plans(self.user_id, before=before, limit=page_size)
+        return fetch_system_week_plans(self.storage, before, page_size)
+    
+    def load_week_plans(self, before=None, page_size=WEEK_PLAN_PAGE_SIZE):
         try:
-            # result = self.supabase.table('week_plans').select('*').eq('user_id', self.user_id).order('created_at', desc=True).execute()
-            result = self.supabase.table('week_plans').select('*').eq('user_id', 'system').order('created_at', desc=True).execute()
-
-            plans = []
-            for item in result.data:
-                plans.append({
-                    'id': item['id'],
-                    '日期': item['plan_date'],
-                    '时间': item['plan_time'],
-                    '食材': json.loads(item['foods_data'])
-                })
-            return plans
+            # only the requested page is decoded
+            rows = self.load_week_plan_rows(before, page_size)
+            return [plan_from_row(item) for item in rows]
         except Exception as e:
             st.error(f"加载周计划失败: {e}")
             return []
     
+    def load_week_plans_since(self, since):
+        return self.storage.select_week_plans('system', since=since)
+    
+    def count_week_plans(self):
+        return self.storage.count_week_plans('system')
+    
     def save_week_plan(self, foods_data):
+        if self.write_queue:
+            self.write_queue.submit('insert_week_plans', [week_plan_row(foods_data)], self.user_id)
+            return True
         try:
-            data = {
-                'user_id': 'system',
-                'plan_date': datetime.now().strftime("%Y-%m-%d"),
-                'plan_time': datetime.now().strftime("%H:%M"),
-                'foods_data': json.dumps(foods_data, ensure_ascii=False),
-                'created_at': datetime.now().isoformat()
-            }
-            result = self.supabase.table('week_plans').insert(data).execute()
+            self.storage.insert_week_plans([week_plan_row(foods_data)])
+            invalidate_week_plans_cache()
             return True
         except Exception as e:
             st.error(f"Failed to save week plan: {e}")
             return False
     
+    def save_week_plans(self, rows):
+        """Store many plans in one multi-row insert, returns the stored rows or None on failure"""
+        if self.write_queue:
+            self.write_queue.submit('insert_week_plans', rows, self.user_id)
+            return rows
+        try:
+            inserted = self.storage.insert_week_plans(rows)
+            invalidate_week_plans_cache()
+            return inserted
+        except Exception as e:
+            st.error(f"Failed to save week plans: {e}")
+            return None
+    
+    def find_week_plans_with_food(self, category, food_name):
+        try:
+            # filtered by the backend, no history download
+            rows = self.storage.find_week_plans_with_food('system', category, food_name)
+            return [plan_from_row(item) for item in rows]
+        except Exception as e:
+            st.error(f"Failed to find week plans: {e}")
+            return []
+    
+    def count_food_picks(self, food_name):
+        try:
+            return self.storage.count_food_picks('system', food_name)
+        except Exception as e:
+            st.error(f"Failed to count food picks: {e}")
+            return None
+    
     def clear_week_plans(self):
         try:
-            result = self.supabase.table('week_plans').delete().eq('user_id', 'system').execute()
+            self.storage.delete_week_plans('system')
+            invalidate_week_plans_cache()
             return True
         except Exception as e:
             st.error(f"Failed to clear week plan: {e}")
             return False
 
+# Delta sync
+# we keep a high-water mark on created_at plus the ids already held locally, so a
+# refresh only fetches rows created since the last sync. deletes made by this
+# session are applied in place; if the server row count doesn't match what we
+# expect, someone else changed the table and we fall back to a full reload
+def _sync_state(rows, total):
+    # total is the server row count, it differs from len(ids) when only some pages are loaded.
+    # None means the count failed; the next sync can't match it and does a full reload
+    return {
+        'high_water': max((item['created_at'] for item in rows if item.get('created_at')), default=None),
+        'ids': {item['id'] for item in rows},
+        'total': total
+    }
+
+def _advance_high_water(state, rows):
+    for item in rows:
+        state['ids'].add(item['id'])
+        if item.get('created_at') and (state['high_water'] is None or item['created_at'] > state['high_water']):
+            state['high_water'] = item['created_at']
+
+def full_reload_foods(db):
+    apply_food_rows(db, db.load_food_rows())
+
+def apply_food_rows(db, rows):
+    st.session_state.catalog = Catalog(rows)
+    st.session_state.foods_sync = _sync_state(rows, total=len(rows))
+    st.session_state.search_index = None
+    invalidate_spin_engine()
+
+def sync_foods(db):
+    # optimistic local state wins until the queued writes have landed
+    if db.has_pending_writes():
+        return
+    drop_food_placeholders()
+    state = st.session_state.get('foods_sync')
+    try:
+        if not state or state['high_water'] is None:
+            full_reload_foods(db)
+            return
+        
+        new_rows = [item for item in db.load_foods_since(state['high_water']) if item['id'] not in state['ids']]
+        if db.count_foods() != state['total'] + len(new_rows):
+            # delta can't be trusted, reload without the shared cache
+            invalidate_foods_cache()
+            full_reload_foods(db)
+            return
+        
+        for item in new_rows:
+            index_add_food(st.session_state.catalog.add(FoodItem.from_row(item)))
+        state['total'] += len(new_rows)
+        if new_rows:
+            invalidate_spin_engine()
+        _advance_high_water(state, new_rows)
+    except Exception as e:
+        st.error(f"同步食材失败: {e}")
+
+def remove_foods_local(food_ids):
+    state = st.session_state.get('foods_sync')
+    for food_id in food_ids:
+        food = st.session_state.catalog.remove_id(food_id)
+        if food is not None:
+            index_remove_food(food)
+        if state:
+            state['ids'].discard(food_id)
+            state['total'] -= 1
+    invalidate_spin_engine()
+
+def _page_cursor(rows, page_size=WEEK_PLAN_PAGE_SIZE):
+    # None once the last page has been loaded
+    if len(rows) < page_size:
+        return None
+    return (rows[-1]['created_at'], rows[-1]['id'])
+
+# Optimistic updates for write-behind mode
+# placeholders have id None until a sync brings in the stored row
+def add_food_local(category, food_name):
+    index_add_food(st.session_state.catalog.add(FoodItem(category, food_name)))
+    invalidate_spin_engine()
+
+def drop_food_placeholders():
+    for food in st.session_state.catalog.drop_placeholders():
+        index_remove_food(food)
+
+def add_week_plan_local(row):
+    st.session_state.week_plan.insert(0, plan_from_row(dict(row, id=None)))
+    invalidate_spin_engine()
+
+def add_week_plans_local(rows):
+    # rows come newest first; stored rows join the sync state so the next delta skips them,
+    # write-behind rows stay placeholders
+    st.session_state.week_plan[:0] = [plan_from_row(dict(item, id=item.get('id'))) for item in rows]
+    stored = [item for item in rows if item.get('id') is not None]
+    state = st.session_state.get('week_plans_sync')
+    if state and stored:
+        if state['total'] is not None:
+            state['total'] += len(stored)
+        _advance_high_water(state, stored)
+    invalidate_spin_engine()
+
+def full_reload_week_plans(db):
+    # only the first page, older plans come in through load_more_week_plans
+    apply_week_plan_rows(db.load_week_plan_rows(), db.count_week_plans())
+
+def apply_week_plan_rows(rows, total):
+    st.session_state.week_plan = [plan_from_row(item) for item in rows]
+    st.session_state.week_plans_sync = _sync_state(rows, total=total)
+    st.session_state.week_plans_cursor = _page_cursor(rows)
+    invalidate_spin_engine()
+
+def sync_week_plans(db):
+    if db.has_pending_writes():
+        return
+    # placeholders are replaced by the real rows coming in with the delta
+    st.session_state.week_plan = [plan for plan in st.session_state.get('week_plan', []) if plan['id'] is not None]
+    state = st.session_state.get('week_plans_sync')
+    try:
+        if not state or state['high_water'] is None or state['total'] is None:
+            full_reload_week_plans(db)
+            return
+        
+        new_rows = [item for item in db.load_week_plans_since(state['high_water']) if item['id'] not in state['ids']]
+        if db.count_week_plans() != state['total'] + len(new_rows):
+            invalidate_week_plans_cache()
+            full_reload_week_plans(db)
+            return
+        
+        # newest first, same order as load_week_plans
+        st.session_state.week_plan[:0] = [plan_from_row(item) for item in new_rows]
+        state['total'] += len(new_rows)
+        if new_rows:
+            invalidate_spin_engine()
+        _advance_high_water(state, new_rows)
+    except Exception as e:
+        st.error(f"同步周计划失败: {e}")
+
+def load_more_week_plans(db):
+    cursor = st.session_state.get('week_plans_cursor')
+    state = st.session_state.get('week_plans_sync')
+    if not cursor or not state:
+        return
+    try:
+        rows = db.load_week_plan_rows(before=cursor)
+    except Exception as e:
+        st.error(f"加载周计划失败: {e}")
+        return
+    
+    st.session_state.week_plans_cursor = _page_cursor(rows)
+    rows = [item for item in rows if item['id'] not in state['ids']]
+    st.session_state.week_plan.extend(plan_from_row(item) for item in rows)
+    state['ids'].update(item['id'] for item in rows)
+
+# Cold start
+# the startup reads don't depend on each other, so they run concurrently and
+# the results are applied here on the script thread. a failing source only
+# blanks its own part of the page
+def cold_start_load(db):
+    ctx = get_script_run_ctx()
+    sources = {
+        'foods': db.load_food_rows,
+        'week_plans': db.load_week_plan_rows,
+        'week_plan_count': db.count_week_plans,
+    }
+    results = {}
+    errors = {}
+    # worker threads need the script context for st.cache_data
+    with ThreadPoolExecutor(
+        max_workers=COLD_START_WORKERS,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as pool:
+        futures = {name: pool.submit(load) for name, load in sources.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    
+    if 'foods' in results:
+        apply_food_rows(db, results['foods'])
+    else:
+        st.session_state.catalog = Catalog()
+        st.error(f"加载食材失败: {errors['foods']}")
+    
+    if 'week_plans' in results:
+        # without a count the total shows as unknown and the next sync does a full reload
+        apply_week_plan_rows(results['week_plans'], results.get('week_plan_count'))
+    else:
+        st.session_state.week_plan = []
+        st.error(f"加载周计划失败: {errors['week_plans']}")
+    if 'week_plan_count' in errors:
+        st.error(f"统计周计划数量失败: {errors['week_plan_count']}")
+
+# Search and dedupe indexes
+# the system foods are indexed once per process and shared; each session builds a layer
+# on top lazily with its own foods, then keeps it in step with adds and deletes
+@st.cache_resource(max_entries=SYSTEM_CACHE_MAX_ENTRIES, show_spinner=False)
+def shared_search_index(fingerprint, _foods_by_category):
+    # fingerprint is the stored system food ids, sessions on the same rows share one trie
+    return FoodSearchIndex(_foods_by_category)
+
+def get_search_index():
+    if st.session_state.get('search_index') is None:
+        shared = {}
+        own = []
+        for category, foods in st.session_state.catalog.items():
+            for food in foods:
+                if food.is_custom or food.id is None:
+                    own.append(food)
+                else:
+                    shared.setdefault(category, []).append(food)
+        fingerprint = hash(tuple(food.id for foods in shared.values() for food in foods))
+        index = LayeredSearchIndex(shared_search_index(fingerprint, shared))
+        for food in own:
+            index.add(food.category, food)
+        st.session_state.search_index = index
+    return st.session_state.search_index
+
+def known_food_keys():
+    # normalized keys of everything loaded, rejects duplicates without a request
+    return st.session_state.catalog.keys
+
+def index_add_food(food):
+    if st.session_state.get('search_index') is not None:
+        st.session_state.search_index.add(food.category, food)
+
+def index_remove_food(food):
+    if st.session_state.get('search_index') is not None:
+        st.session_state.search_index.remove(food.category, food.name)
+
+# Catalog import
+# streams the uploaded file through catalog_io in chunks, the checkpoint per file
+# lets an interrupted import continue where it stopped
+def run_catalog_import(db, uploaded, import_id, start_at):
+    checkpoints = st.session_state.setdefault('import_checkpoints', {})
+    progress_bar = st.progress(0.0, text="正在导入...")
+    lines = io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+    stats = None
+    try:
+        records = read_food_records(lines, detect_format(uploaded.name))
+        for stats in import_foods(db.storage, records, known_food_keys(), start_at=start_at):
+            checkpoints[import_id] = stats['processed']
+            progress_bar.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0),
+                                  text=f"已处理 {stats['processed']} 条")
+    except Exception as e:
+        st.error(f"导入中断: {e}，可以稍后继续导入")
+        return
+    finally:
+        lines.detach()
+        if stats and stats['added']:
+            invalidate_foods_cache()
+            sync_foods(db)
+    
+    checkpoints.pop(import_id, None)
+    progress_bar.empty()
+    message = f"✅ 导入完成：新增 {stats['added']} 种，重复 {stats['duplicate']} 种，无效 {stats['invalid']} 条"
+    if stats['added']:
+        rerun_app('add_manage', [('success', message)])
+    st.success(message)
+
+# Catalog export
+# rows are paged from storage into a temp file, session state only keeps its path.
+# the previous export of the session is removed when a new one is made
+def export_to_file(db, table, fmt):
+    previous = st.session_state.pop('export_file', None)
+    if previous:
+        try:
+            os.remove(previous[0])
+        except OSError:
+            pass
+    with tempfile.NamedTemporaryFile('w', suffix=f'.{fmt}', prefix=f'{table}-', newline='',
+                                     encoding='utf-8', delete=False) as out:
+        try:
+            count = export_table(db.storage, table, out, fmt)
+        except Exception as e:
+            out.close()
+            os.remove(out.name)
+            st.error(f"导出失败: {e}")
+            return
+    st.session_state.export_file = (out.name, f"{table}.{fmt}", count)
+
+# Spin engine
+# built once from the loaded catalog and dropped whenever foods or plans change
+def get_spin_engine():
+    if st.session_state.get('spin_engine') is None:
+        st.session_state.spin_engine = build_spin_engine(
+            st.session_state.catalog, st.session_state.get('week_plan', [])
+        )
+    return st.session_state.spin_engine
+
+def invalidate_spin_engine():
+    st.session_state.spin_engine = None
+
 # css styling
 st.markdown("""
 <style>
@@ -220,6 +689,23 @@ st.markdown("""
         50% { transform: scale(1.05); }
         100% { transform: scale(1); }
     }
+    .spin-reel {
+        height: 2.4rem;
+        overflow: hidden;
+    }
+    .spin-reel-strip {
+        animation: spin-reel 1.2s cubic-bezier(0.15, 0.85, 0.35, 1) both;
+    }
+    .spin-reel-strip div {
+        height: 2.4rem;
+        line-height: 2.4rem;
+        font-size: 1.5rem;
+        font-weight: bold;
+    }
+    @keyframes spin-reel {
+        from { transform: translateY(0); }
+        to { transform: translateY(var(--reel-end)); }
+    }
     .cloud-status {
         background: linear-gradient(45deg, #667eea, #764ba2);
         color: white;
@@ -231,47 +717,78 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def main():
-    st.markdown('<h1 class="main-header">🚥 健康食谱转盘</h1>', unsafe_allow_html=True)
-    
-    # Initialize Supabase
-    supabase = init_supabase()
-    if not supabase:
-        st.stop()
+# Diagnostics panel
+# hidden unless the page is opened with ?debug=1
+def render_diagnostics_panel():
+    with st.sidebar:
+        st.markdown("### 🩺 性能诊断")
+        snapshot = METRICS.snapshot()
+        if not snapshot:
+            st.info("还没有记录")
+            return
+        # cold-start breakdown: app imports, supabase import, client creation, first round trip, first load
+        startup = {name: values for name, values in snapshot.items() if name.startswith('startup.')}
+        if startup:
+            st.markdown("#### 🚀 启动耗时")
+            st.dataframe(
+                [{'step': name[len('startup.'):], 'ms': round(values['total_ms'], 1), 'count': values['count']}
+                 for name, values in startup.items()],
+                hide_index=True
+            )
+        st.dataframe(
+            [{'name': name, **values} for name, values in snapshot.items()],
+            hide_index=True
+        )
+        st.download_button("Prometheus", METRICS.to_prometheus(), file_name="metrics.txt")
+        st.download_button("JSON", METRICS.to_json(), file_name="metrics.json")
+        if st.button("重置统计"):
+            METRICS.reset()
 
-    db = DatabaseManager(supabase)
-    
-    # Cloud status display
-    st.markdown(f'''
-    <div class="cloud-status">
-        ☁️ 已连接云数据库 | 用户ID: {get_user_id()[:8]}... | 数据实时同步
-    </div>
-    ''', unsafe_allow_html=True)
-    
-    # Initialize session state
-    if 'spinning' not in st.session_state:
-        st.session_state.spinning = False
-    if 'selected_foods' not in st.session_state:
-        st.session_state.selected_foods = {}
-    if 'data_loaded' not in st.session_state:
-        st.session_state.data_loaded = False
-    if 'foods_data' not in st.session_state:
-        st.session_state.foods_data = {}
-    
-    # Load initial food from database
-    if not st.session_state.data_loaded:
-        with st.spinner("正在从云端加载数据..."):
-            st.session_state.foods_data = db.load_all_foods()
-            st.session_state.week_plan = db.load_week_plans()
-            st.session_state.categories = db.get_categories()
-        st.session_state.data_loaded = True
+# Tabs
+# every tab is a fragment, so widgets inside one only rerun that tab. state is
+# shared through session_state; an action that changes what other tabs show
+# reruns the whole app once and its messages are shown again after the rerun
+def rerun_app(tab, messages):
+    st.session_state.flash = (tab, messages)
+    st.rerun(scope="app")
 
-    tab1, tab2, tab3, tab4 = st.tabs(["🎯 转盘选择", "📅 本周计划", "🍽️ 食材库", "➕ 添加食材"])
-    
-    with tab1:
+def show_flash(tab):
+    flash = st.session_state.get('flash')
+    if flash and flash[0] == tab:
+        del st.session_state.flash
+        for level, message in flash[1]:
+            getattr(st, level)(message)
+
+def custom_food_picker(foods, key):
+    """Multi-select table of custom foods, returns the selected ones"""
+    selection = st.dataframe(
+        [{'类别': food.category, '食材': food.name} for food in foods],
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        # the selection is kept by row position, so the key follows the rows shown: after a
+        # filter, page change, sync or delete it's a new table and nothing stays selected
+        key=f"{key}_{hash(tuple(food.id for food in foods))}"
+    )
+    return [foods[row] for row in selection.selection.rows]
+
+def delete_selected_foods(db, foods, tab):
+    # the whole selection goes out in one request and is dropped from the local catalog, no reload
+    food_ids = [food.id for food in foods]
+    with st.spinner("正在从云端删除..."):
+        deleted = db.delete_foods(food_ids)
+    if deleted:
+        remove_foods_local(food_ids)
+        rerun_app(tab, [('success', f"已删除 {len(food_ids)} 种食材")])
+    st.error("删除失败，请检查网络连接")
+
+@st.fragment
+def render_spinner_tab(db):
+    with METRICS.timed('render.spinner'):
         st.markdown("### 🎲 转转盘，选择本周的健康食材！")
+        show_flash('spinner')
         
-        if not st.session_state.categories:
+        if not st.session_state.catalog.categories:
             st.warning("⚠️ 数据库中没有食材，请先添加一些食材！")
             return
         
@@ -280,48 +797,25 @@ def main():
         with col1:
             selected_categories = st.multiselect(
                 "选择要转盘的食材类别：",
-                st.session_state.categories,
+                st.session_state.catalog.categories,
                 default=['🌾 碳水','🥩 蛋白质','🥬 蔬菜']
             )
         
         with col2:
             spin_button = st.button("🎯 开始转盘", type="primary")
         
+        spin_reels = None
         if spin_button and selected_categories:
-            st.session_state.spinning = True
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            selected_foods = {}
-            
-            for i, category in enumerate(selected_categories):
-                status_text.text(f"正在选择 {category}...")
-                
-                # Get all foods from selected category
-                category_foods = st.session_state.foods_data.get(category, [])
-                if not category_foods:
+            for category in selected_categories:
+                if not st.session_state.catalog.names.get(category):
                     st.warning(f"类别 {category} 中没有食材！")
-                    continue
-                
-                food_names = [food['name'] for food in category_foods]
-                
-                # Simulate spinning wheel
-                for j in range(10):
-                    temp_food = random.choice(food_names)
-                    status_text.text(f"{category}: {temp_food}")
-                    time.sleep(0.1)
-                    progress_bar.progress((i * 10 + j + 1) / (len(selected_categories) * 10))
-                
-                # Pick food with randomization
-                selected_food = random.choice(food_names)
-                selected_foods[category] = selected_food
-                
+            
+            # one vectorized draw for every category: the reel frames plus the final pick,
+            # the wheel itself is animated in the browser
+            frames = get_spin_engine().spin(selected_categories, n=SPIN_REEL_FRAMES + 1)
+            selected_foods = frames[-1] if frames else {}
+            spin_reels = {category: [frame[category] for frame in frames] for category in selected_foods}
             st.session_state.selected_foods = selected_foods
-            st.session_state.spinning = False
-
-            progress_bar.empty()
-            status_text.empty()
             
             # display result
             st.success("🎉 转盘完成！本次选中的食材：")
@@ -330,24 +824,61 @@ def main():
             cols = st.columns(len(st.session_state.selected_foods))
             for i, (category, food) in enumerate(st.session_state.selected_foods.items()):
                 with cols[i]:
-                    st.markdown(f"""
-                    <div style="text-align: center; padding: 20px; 
-                                border-radius: 15px; margin: 10px; color: #333;">
-                        <h4>{category}</h4>
-                        <h3>{food}</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    if spin_reels and category in spin_reels:
+                        # css keyframes scroll the reel and stop on the selected food,
+                        # categories start one after another like the old loop
+                        reel_items = "".join(f"<div>{name}</div>" for name in spin_reels[category])
+                        # single-line html, a blank line or indentation would end the html block
+                        # and markdown would show the reel as a code block
+                        food_html = (
+                            '<div class="spin-reel">'
+                            f'<div class="spin-reel-strip" style="--reel-end: {-SPIN_REEL_FRAMES * 2.4}rem; animation-delay: {i * 0.3}s;">'
+                            f'{reel_items}</div></div>'
+                        )
+                    else:
+                        food_html = f"<h3>{food}</h3>"
+                    st.markdown(
+                        '<div style="text-align: center; padding: 20px; border-radius: 15px; margin: 10px; color: #333;">'
+                        f'<h4>{category}</h4>{food_html}</div>',
+                        unsafe_allow_html=True
+                    )
             
             # Add to week plan button
             if st.button("📅 添加到本周计划"):
                 if db.save_week_plan(dict(st.session_state.selected_foods)):
-                    # reload for the most updated week plan
-                    st.session_state.week_plan = db.load_week_plans()
-                    st.success("✅ 已添加到本周计划并同步到云端！")
+                    if db.write_queue:
+                        # shown right away, written in the background
+                        add_week_plan_local(week_plan_row(dict(st.session_state.selected_foods)))
+                    else:
+                        # only fetch plans newer than what we already have
+                        sync_week_plans(db)
+                    rerun_app('spinner', [('success', "✅ 已添加到本周计划并同步到云端！")])
                 else:
                     st.error("❌ 保存失败，请检查网络连接")
-    
-    with tab2:
+        
+        # a whole week in one draw and one insert
+        st.markdown("---")
+        st.markdown("#### 🗓️ 一键生成一周计划")
+        week_col1, week_col2 = st.columns([3, 1])
+        with week_col1:
+            meals = st.radio("每天几餐", list(MEAL_TIMES), index=len(MEAL_TIMES) - 1, horizontal=True, key="week_meals")
+        with week_col2:
+            week_button = st.button(f"🗓️ 生成 {WEEK_DAYS} 天计划")
+        if week_button:
+            if not selected_categories:
+                st.warning("请先选择食材类别")
+                return
+            plans = get_spin_engine().spin_week(selected_categories, days=WEEK_DAYS, meals=meals)
+            stored = db.save_week_plans(week_plan_rows(plans, meals))
+            if stored:
+                add_week_plans_local(stored)
+                rerun_app('spinner', [('success', f"✅ 已生成 {WEEK_DAYS} 天共 {len(stored)} 个计划并同步到云端！")])
+            else:
+                st.error("❌ 保存失败，请检查网络连接")
+
+@st.fragment
+def render_week_plan_tab(db):
+    with METRICS.timed('render.week_plan'):
         st.markdown("### 📅 本周食材计划")
         
         # Refresh button
@@ -356,7 +887,7 @@ def main():
             st.markdown("从云端同步的所有计划：")
         with col2:
             if st.button("🔄 刷新"):
-                st.session_state.week_plan = db.load_week_plans()
+                sync_week_plans(db)
                 st.success("已刷新数据！")
         
         if st.session_state.week_plan:
@@ -364,13 +895,16 @@ def main():
             if st.button("🗑️ 清空所有计划"):
                 if db.clear_week_plans():
                     st.session_state.week_plan = []
+                    st.session_state.week_plans_sync = None
+                    st.session_state.week_plans_cursor = None
+                    invalidate_spin_engine()
                     st.success("计划已清空并同步到云端！")
                 else:
                     st.error("清空失败，请检查网络连接")
             
             # 显示计划
             for i, plan in enumerate(st.session_state.week_plan):
-                with st.expander(f"计划 {i+1} - {plan['日期']} {plan['时间']}", expanded=True):
+                with st.expander(f"计划 {i+1} - {plan['日期']} {plan['时间']}", expanded=False):
                     cols = st.columns(len(plan['食材']))
                     for j, (category, food) in enumerate(plan['食材'].items()):
                         with cols[j]:
@@ -380,73 +914,120 @@ def main():
                                 {food}
                             </div>
                             """, unsafe_allow_html=True)
+            
+            # older plans are fetched one page at a time
+            if st.session_state.get('week_plans_cursor'):
+                total = st.session_state.week_plans_sync['total']
+                if total is None:
+                    total = "?"
+                st.button(
+                    f"⬇️ 加载更多（已显示 {len(st.session_state.week_plan)} / {total}）",
+                    on_click=load_more_week_plans, args=(db,)
+                )
         else:
             st.info("📝 还没有制定计划，去转盘页面选择一些食材吧！")
-    
-    with tab3:
+
+@st.fragment
+def render_library_tab(db):
+    with METRICS.timed('render.library'):
         st.markdown("### 🍽️ 食材库")
+        show_flash('library')
         
         col1, col2 = st.columns([3, 1])
         with col2:
             if st.button("🔄 刷新食材库"):
-                st.session_state.foods_data = db.load_all_foods()
-                st.session_state.categories = db.get_categories()
-                st.success("食材库已刷新！")
+                sync_foods(db)
+                rerun_app('library', [('success', "食材库已刷新！")])
         
-        if not st.session_state.foods_data:
+        if not st.session_state.catalog:
             st.info("📝 食材库为空，请在'添加食材'页面添加一些食材！")
             return
         
-        # 显示所有食材
-        for category, foods in st.session_state.foods_data.items():
-            st.markdown(f'<div class="category-header">{category}</div>', unsafe_allow_html=True)
-            
-            # 以网格形式显示食材
-            cols = st.columns(4)
-            for i, food_info in enumerate(foods):
-                with cols[i % 4]:
-                    food_name = food_info['name']
-                    is_custom = food_info['is_custom']
-                    food_id = food_info['id']
-                    
-                    if not is_custom:
-                        # 系统食材
-                        st.markdown(f'<div class="food-item">{food_name} </div>', unsafe_allow_html=True)
-                    else:
-                        # 用户自定义食材，有删除按钮
-                        food_col, del_col = st.columns([3, 1])
-                        with food_col:
-                            st.markdown(f'<div class="custom-food-item">{food_name} ☁️</div>', unsafe_allow_html=True)
-                        with del_col:
-                            if st.button("🗑️", key=f"del_{food_id}", help=f"删除 {food_name}"):
-                                if db.delete_food(food_id):
-                                    # 重新加载数据
-                                    st.session_state.foods_data = db.load_all_foods()
-                                    st.success(f"已删除 {food_name}")
-                                    st.rerun()
-                                else:
-                                    st.error("删除失败")
-            
-            st.markdown("<br>", unsafe_allow_html=True)
+        # 筛选
+        filter_col, category_col = st.columns([2, 1])
+        with filter_col:
+            library_filter = st.text_input("🔍 筛选食材（支持拼音，如 xlh）", key="library_filter").strip()
+        with category_col:
+            library_category = st.selectbox("类别", ["全部"] + st.session_state.catalog.categories, key="library_category")
+        
+        if library_filter:
+            index = get_search_index()
+            matches = [
+                (category, food) for category, food in index.search(library_filter, limit=len(index))
+                if library_category in ("全部", category)
+            ]
+        else:
+            matches = [
+                (category, food)
+                for category, foods in st.session_state.catalog.items()
+                if library_category in ("全部", category)
+                for food in foods
+            ]
+        
+        # 分页，每次只渲染一页
+        page_count = max(1, -(-len(matches) // LIBRARY_PAGE_SIZE))
+        if st.session_state.get("library_page", 1) > page_count:
+            st.session_state.library_page = 1
+        page = 1
+        if page_count > 1:
+            page = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, key="library_page")
+        page_items = matches[(page - 1) * LIBRARY_PAGE_SIZE:page * LIBRARY_PAGE_SIZE]
+        
+        # 每个类别一个 html 块，而不是每种食材一个元素
+        page_by_category = {}
+        for category, food in page_items:
+            page_by_category.setdefault(category, []).append(food)
+        for category, foods in page_by_category.items():
+            chips = "".join(
+                f'<div class="custom-food-item">{food.name} ☁️</div>' if food.is_custom
+                else f'<div class="food-item">{food.name} </div>'
+                for food in foods
+            )
+            st.markdown(f'<div class="category-header">{category}</div>{chips}<br>', unsafe_allow_html=True)
+        
+        if not matches:
+            st.info("没有匹配的食材")
+        
+        # 用户自定义食材，勾选后删除
+        custom_items = [food for category, food in matches if food.is_custom]
+        if custom_items:
+            st.markdown("#### ☁️ 我的食材")
+            selected = custom_food_picker(custom_items, key="library_custom_table")
+            if selected and st.button(f"🗑️ 删除选中的 {len(selected)} 种食材"):
+                delete_selected_foods(db, selected, 'library')
         
         # 食材统计
-        total_system = sum(1 for foods in st.session_state.foods_data.values() for food in foods if not food['is_custom'])
-        total_custom = sum(1 for foods in st.session_state.foods_data.values() for food in foods if food['is_custom'])
-        total_foods = total_system + total_custom
+        catalog = st.session_state.catalog
+        total_system = catalog.system_count
+        total_custom = catalog.custom_count
+        total_foods = len(catalog)
         
         st.markdown(f"""
         <div style="text-align: center; padding: 20px; background: #e8f5e8; border-radius: 10px; margin: 20px 0;">
             <h3>📊 食材库统计</h3>
             <p>系统食材：<strong>{total_system}</strong> 种 | 用户自定义：<strong>{total_custom}</strong> 种</p>
             <p>总共有 <strong>{total_foods}</strong> 种健康食材</p>
-            <p>涵盖 <strong>{len(st.session_state.categories)}</strong> 个营养类别</p>
+            <p>涵盖 <strong>{len(st.session_state.catalog.categories)}</strong> 个营养类别</p>
         </div>
         """, unsafe_allow_html=True)
-    
-    with tab4:
+
+@st.fragment
+def render_add_manage_tab(db):
+    with METRICS.timed('render.add_manage'):
         st.markdown("### ➕ 添加自定义食材")
+        show_flash('add_manage')
         st.markdown("在这里添加您喜欢的健康食材，数据会自动同步到云端！")
         
+        # 添加前先查一下是否已有
+        lookup = st.text_input("🔍 查找食材（支持拼音首字母，如 xlh）", key="add_lookup").strip()
+        if lookup:
+            found = get_search_index().search(lookup, limit=SEARCH_RESULTS_LIMIT)
+            if found:
+                chips = "".join(f'<div class="food-item">{food.name} · {category}</div>' for category, food in found)
+                st.markdown(chips, unsafe_allow_html=True)
+            else:
+                st.caption("没有找到，可以在下面添加")
+        
         # Batch add
         st.markdown("#### 🚀 批量添加")
         
@@ -457,8 +1038,8 @@ def main():
             category_option = st.radio("类别选择方式", ["选择现有类别", "创建新类别"])
             
             if category_option == "选择现有类别":
-                if st.session_state.categories:
-                    batch_category = st.selectbox("选择类别", st.session_state.categories, key="batch_category")
+                if st.session_state.catalog.categories:
+                    batch_category = st.selectbox("选择类别", st.session_state.catalog.categories, key="batch_category")
                 else:
                     st.warning("没有现有类别，请先创建新类别")
                     batch_category = st.text_input("新类别名称", key="new_batch_category")
@@ -475,33 +1056,30 @@ def main():
             st.markdown("<br><br><br>", unsafe_allow_html=True)
             if st.button("📦 批量添加", type="primary"):
                 if batch_foods.strip() and batch_category.strip():
-                    new_foods = [food.strip() for food in batch_foods.strip().split('\n') if food.strip()]
-                    added_count = 0
-                    duplicate_count = 0
-                    failed_count = 0
+                    new_foods = batch_foods.strip().split('\n')
                     
                     with st.spinner("正在上传到云端..."):
-                        for food in new_foods:
-                            success, message = db.add_food(batch_category.strip(), food)
-                            if success:
-                                added_count += 1
-                            elif "已存在" in message:
-                                duplicate_count += 1
-                            else:
-                                failed_count += 1
-                    
-                    # refreshing data
-                    if added_count > 0:
-                        st.session_state.foods_data = db.load_all_foods()
-                        st.session_state.categories = db.get_categories()
+                        results = db.add_foods_bulk(batch_category.strip(), new_foods, known_food_keys())
+                    statuses = [status for _, status in results]
+                    added_count = statuses.count('added')
+                    duplicate_count = statuses.count('duplicate')
+                    failed_count = statuses.count('failed')
                     
                     # result display
+                    messages = []
                     if added_count > 0:
-                        st.success(f"✅ 成功添加 {added_count} 种食材到 {batch_category}")
+                        messages.append(('success', f"✅ 成功添加 {added_count} 种食材到 {batch_category}"))
                     if duplicate_count > 0:
-                        st.warning(f"⚠️ {duplicate_count} 种食材已存在，已跳过")
+                        messages.append(('warning', f"⚠️ {duplicate_count} 种食材已存在，已跳过"))
                     if failed_count > 0:
-                        st.error(f"❌ {failed_count} 种食材添加失败")
+                        messages.append(('error', f"❌ {failed_count} 种食材添加失败"))
+                    
+                    # refreshing data
+                    if added_count > 0:
+                        sync_foods(db)
+                        rerun_app('add_manage', messages)
+                    for level, message in messages:
+                        getattr(st, level)(message)
                 else:
                     st.error("请填写类别和食材名称")
         
@@ -520,8 +1098,8 @@ def main():
             single_category_option = st.radio("类别选择", ["现有类别", "新类别"], key="single_cat_option")
             
             if single_category_option == "现有类别":
-                if st.session_state.categories:
-                    single_food_category = st.selectbox("选择类别", st.session_state.categories, key="single_category")
+                if st.session_state.catalog.categories:
+                    single_food_category = st.selectbox("选择类别", st.session_state.catalog.categories, key="single_category")
                 else:
                     single_food_category = st.text_input("新类别名称", key="single_new_category")
             else:
@@ -532,12 +1110,17 @@ def main():
             if st.button("✅ 添加", key="single_add"):
                 if single_food_name.strip() and single_food_category.strip():
                     with st.spinner("正在保存到云端..."):
-                        success, message = db.add_food(single_food_category.strip(), single_food_name.strip())
+                        if food_key(single_food_category.strip(), single_food_name.strip()) in known_food_keys():
+                            success, message = False, "食材已存在"
+                        else:
+                            success, message = db.add_food(single_food_category.strip(), single_food_name.strip())
                         if success:
-                            # refreshing data
-                            st.session_state.foods_data = db.load_all_foods()
-                            st.session_state.categories = db.get_categories()
-                            st.success(f"✅ {message}：'{single_food_name}' 已添加到 {single_food_category}")
+                            if db.write_queue:
+                                add_food_local(single_food_category.strip(), single_food_name.strip())
+                            else:
+                                # refreshing data
+                                sync_foods(db)
+                            rerun_app('add_manage', [('success', f"✅ {message}：'{single_food_name}' 已添加到 {single_food_category}")])
                         else:
                             if "已存在" in message:
                                 st.warning(f"⚠️ {message}")
@@ -548,32 +1131,47 @@ def main():
         
         st.markdown("---")
         
+        # import / export
+        st.markdown("#### 📁 导入 / 导出")
+        
+        import_col, export_col = st.columns(2)
+        
+        with import_col:
+            uploaded = st.file_uploader("导入食材（CSV 列 category,food_name 及可选的 weight、JSON Lines 或 JSON 数组）",
+                                        type=["csv", "jsonl", "json"])
+            if uploaded is not None:
+                import_id = f"{uploaded.name}:{uploaded.size}"
+                checkpoint = st.session_state.get('import_checkpoints', {}).get(import_id, 0)
+                if st.button(f"⏯️ 从第 {checkpoint} 条继续导入" if checkpoint else "📥 开始导入"):
+                    run_catalog_import(db, uploaded, import_id, checkpoint)
+        
+        with export_col:
+            export_name = st.selectbox("导出数据", ["foods", "week_plans"],
+                                       format_func=lambda name: "食材" if name == "foods" else "周计划")
+            export_format = st.radio("格式", ["csv", "jsonl"], horizontal=True, key="export_format")
+            if st.button("📤 生成导出文件"):
+                export_to_file(db, export_name, export_format)
+            export_file = st.session_state.get('export_file')
+            if export_file and os.path.exists(export_file[0]):
+                path, file_name, count = export_file
+                with open(path, 'rb') as f:
+                    st.download_button(f"⬇️ 下载 {file_name}（{count} 条）", f, file_name=file_name)
+        
+        st.markdown("---")
+        
         # TODO manage user-added food
         st.markdown("#### 🛠️ 管理我的食材")
         
-        user_foods = {category: [food for food in foods if food['is_custom']] 
-                     for category, foods in st.session_state.foods_data.items()}
-        user_foods = {k: v for k, v in user_foods.items() if v}  # 过滤空类别
+        user_foods = st.session_state.catalog.custom
         
         if user_foods:
-            for category, foods in user_foods.items():
-                with st.expander(f"{category} - {len(foods)} 种自定义食材"):
-                    cols = st.columns(3)
-                    for i, food_info in enumerate(foods):
-                        food_name = food_info['name']
-                        food_id = food_info['id']
-                        with cols[i % 3]:
-                            food_col, del_col = st.columns([3, 1])
-                            with food_col:
-                                st.write(f"☁️ {food_name}")
-                            with del_col:
-                                if st.button("删除", key=f"manage_del_{food_id}"):
-                                    if db.delete_food(food_id):
-                                        st.session_state.foods_data = db.load_all_foods()
-                                        st.success("已从云端删除")
-                                        st.rerun()
-                                    else:
-                                        st.error("删除失败")
+            st.caption(" | ".join(f"{category} {len(foods)} 种" for category, foods in user_foods.items()))
+            # 勾选多个后一次删除
+            selected = custom_food_picker(
+                [food for foods in user_foods.values() for food in foods], key="manage_custom_table"
+            )
+            if selected and st.button(f"🗑️ 删除选中的 {len(selected)} 种食材", key="manage_delete"):
+                delete_selected_foods(db, selected, 'add_manage')
             
             # 清空所有用户食材
             st.markdown("#### 🧹 清理选项")
@@ -583,10 +1181,9 @@ def main():
                     with st.spinner("正在从云端删除..."):
                         if db.clear_user_foods():
                             # 重新加载数据
-                            st.session_state.foods_data = db.load_all_foods()
-                            st.session_state.categories = db.get_categories()
-                            st.success("🧹 已清空所有自定义食材")
-                            st.rerun()
+                            st.session_state.foods_sync = None
+                            sync_foods(db)
+                            rerun_app('add_manage', [('success', "🧹 已清空所有自定义食材")])
                         else:
                             st.error("清空失败，请检查网络连接")
         else:
@@ -594,7 +1191,81 @@ def main():
         
         # 云端状态显示
         st.markdown("---")
-        
+
+# Session setup
+# storage, status banners and the first load, rendered above the tabs
+def init_session():
+    # Initialize storage
+    with st.spinner("正在连接云数据库..."):
+        storage = init_storage()
+    if not storage:
+        st.stop()
+
+    db = DatabaseManager(storage, init_write_queue(storage))
+    
+    # Cloud status display
+    st.markdown(f'''
+    <div class="cloud-status">
+        ☁️ 已连接云数据库 | 用户ID: {get_user_id()[:8]}... | 数据实时同步
+    </div>
+    ''', unsafe_allow_html=True)
+    
+    # Write-behind status
+    pending_writes, failed_writes = db.write_status()
+    if pending_writes:
+        st.caption(f"⏳ {len(pending_writes)} 项修改正在后台同步到云端...")
+    if failed_writes:
+        st.warning(f"❌ {len(failed_writes)} 项修改同步失败: {failed_writes[-1].error}")
+        if st.button("🔁 重试同步"):
+            db.write_queue.retry_failed(db.user_id)
+            st.rerun()
+    
+    # Initialize session state
+    if 'selected_foods' not in st.session_state:
+        st.session_state.selected_foods = {}
+    if 'data_loaded' not in st.session_state:
+        st.session_state.data_loaded = False
+    if 'catalog' not in st.session_state:
+        st.session_state.catalog = Catalog()
+    
+    # Load initial food from database
+    if not st.session_state.data_loaded:
+        with st.spinner("正在从云端加载数据..."), METRICS.timed('startup.cold_load'):
+            cold_start_load(db)
+        st.session_state.data_loaded = True
+    
+    # reads fell back to the stale cache or the circuit breaker is open
+    if storage.degraded:
+        st.warning("⚠️ 云端暂时不可用，正在显示缓存数据，修改可能无法保存")
+    
+    return db
+
+def main():
+    st.markdown('<h1 class="main-header">🚥 健康食谱转盘</h1>', unsafe_allow_html=True)
+    # connecting starts right away, the skeleton below is sent while it runs
+    start_storage_warmup()
+    
+    if st.query_params.get("debug") == "1":
+        render_diagnostics_panel()
+    
+    status_area = st.container()
+    tab1, tab2, tab3, tab4 = st.tabs(["🎯 转盘选择", "📅 本周计划", "🍽️ 食材库", "➕ 添加食材"])
+    
+    with status_area:
+        db = init_session()
+    
+    with tab1:
+        render_spinner_tab(db)
+    
+    with tab2:
+        render_week_plan_tab(db)
+    
+    with tab3:
+        render_library_tab(db)
+    
+    with tab4:
+        render_add_manage_tab(db)
+    
     st.markdown("""
     <div style="text-align: center; color: #666; padding: 20px;">
         <p>🌱 健康饮食，从每一餐开始</p>
@@ -604,4 +1275,6 @@ def main():
     """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # whole script run, compare against the storage.* timings to split network from rerun overhead
+    with METRICS.timed('rerun'):
+        main()
\ No newline at end of file
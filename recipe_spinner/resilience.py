@@ -0,0 +1,226 @@
+import functools
+import inspect
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# StorageBackend methods that only read, safe to retry and to answer from the stale cache
+READ_METHODS = frozenset({
+    'select_foods', 'select_foods_page', 'count_foods',
+    'select_week_plans', 'count_week_plans',
+    'find_week_plans_with_food', 'count_food_picks',
+})
+
+
+# SQLSTATE classes that mean the database side is struggling, not that the query is wrong:
+# connection exceptions, insufficient resources, operator intervention (restarts)
+TRANSIENT_SQLSTATE_CLASSES = ('08', '53', '57')
+
+
+# reads that return rows; a per-session one with nothing to serve is answered with no rows
+ROW_READ_METHODS = frozenset({'select_foods', 'select_week_plans', 'find_week_plans_with_food'})
+
+
+class StorageUnavailable(Exception):
+    """The circuit is open or a call ran out of time/attempts, and there's nothing stale to serve"""
+
+
+def is_transient(error):
+    """Timeouts, dropped connections and 5xx; bad requests and constraint errors are not,
+    retrying them can't help and they say nothing about the backend's health"""
+    if isinstance(error, (StorageUnavailable, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        return 'locked' in str(error) or 'busy' in str(error)
+    # httpx only comes with supabase, so its errors are matched by name:
+    # TransportError covers its timeouts and connect/read errors
+    if any(cls.__name__ == 'TransportError' for cls in type(error).__mro__):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status >= 500
+    # postgrest APIError: the http status when the body wasn't json,
+    # otherwise a PGRST code (PGRST000-003 are connection problems) or a SQLSTATE
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code >= 500
+    if isinstance(code, str):
+        return code in ('PGRST000', 'PGRST001', 'PGRST002', 'PGRST003') or code[:2] in TRANSIENT_SQLSTATE_CLASSES
+    return False
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures; after `cooldown`
+    seconds one trial call is let through (half-open) and its result closes or reopens it"""
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class ResilientStorage:
+    """Wraps a StorageBackend with per-call timeouts, retries and a circuit breaker.
+
+    Reads get `timeout` seconds per attempt and transient failures are
+    retried with jittered exponential backoff. Writes run once on the
+    caller's thread with only the client's own timeout: an abandoned write
+    keeps running and may still commit, so it can't be reported as failed.
+    The breaker sees one result per call, and only transient errors count
+    against it.
+
+    The last good result of each shared read (only `shared_users`, e.g. the
+    system catalog and the first page of its plans) is kept, and while the
+    backend is failing (or the breaker is open) those reads fall back to it.
+    Per-session reads aren't kept, a new session has nothing cached anyway;
+    while degraded they come back empty. Paged reads (exports, older plan
+    pages) are neither kept nor faked, they raise StorageUnavailable.
+    """
+
+    def __init__(self, storage, timeout=5.0, retries=2, base_delay=0.2,
+                 failure_threshold=5, cooldown=30.0, stale_entries=64, workers=8,
+                 shared_users=('system',)):
+        self.storage = storage
+        self.shared_users = frozenset(shared_users)
+        self.timeout = timeout
+        self.retries = retries
+        self.base_delay = base_delay
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.stale_entries = stale_entries
+        self.stale = OrderedDict()
+        self.stale_lock = threading.Lock()
+        self.serving_stale = False
+        # calls run on a pool so a hung request can be abandoned after `timeout`
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='storage')
+
+    @property
+    def degraded(self):
+        return self.breaker.state != 'closed' or self.serving_stale
+
+    def __getattr__(self, name):
+        attr = getattr(self.storage, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            if name not in READ_METHODS:
+                return self._write(attr, args, kwargs)
+            scope = self._stale_scope(attr, name, args, kwargs)
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+            try:
+                result = self._call(attr, args, kwargs, attempts=self.retries + 1)
+            except StorageUnavailable:
+                if scope == 'shared':
+                    return self._stale_result(key)
+                if scope == 'user' and name in ROW_READ_METHODS:
+                    self.serving_stale = True
+                    return []
+                raise
+            if scope == 'shared':
+                self._remember(key, result)
+            return result
+        return call
+
+    def _stale_scope(self, func, name, args, kwargs):
+        """'shared' for reads every session makes alike, 'user' for per-session reads, None for pages"""
+        call = inspect.signature(func).bind(*args, **kwargs).arguments
+        if name == 'select_foods_page' or call.get('before') is not None:
+            return None
+        users = call.get('user_ids', call.get('user_id'))
+        if users is None:
+            return None
+        users = [users] if isinstance(users, str) else users
+        return 'shared' if set(users) <= self.shared_users else 'user'
+
+    def _call(self, func, args, kwargs, attempts=1):
+        # retries belong to the same call, so a half-open trial is let through once
+        if not self.breaker.allow():
+            raise StorageUnavailable("storage circuit is open")
+        for attempt in range(attempts):
+            future = self.pool.submit(func, *args, **kwargs)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout as e:
+                error = StorageUnavailable(f"storage call timed out after {self.timeout}s")
+                error.__cause__ = e
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            if not is_transient(error):
+                # the backend answered, the request itself is wrong
+                self.breaker.record_success()
+                raise error
+            if attempt + 1 < attempts:
+                time.sleep(self.base_delay * (2 ** attempt) * (1 + random.random()))
+        self.breaker.record_failure()
+        if isinstance(error, StorageUnavailable):
+            raise error
+        # always StorageUnavailable, so retries=0 still falls back to stale results
+        raise StorageUnavailable(f"storage call failed after {attempts} attempt(s): {error}") from error
+
+    def _write(self, func, args, kwargs):
+        if not self.breaker.allow():
+            raise StorageUnavailable("storage circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            raise StorageUnavailable(f"storage write failed, it may still have been saved: {e}") from e
+        self.breaker.record_success()
+        return result
+
+    def _remember(self, key, result):
+        with self.stale_lock:
+            self.stale[key] = result
+            self.stale.move_to_end(key)
+            while len(self.stale) > self.stale_entries:
+                self.stale.popitem(last=False)
+            self.serving_stale = False
+
+    def _stale_result(self, key):
+        with self.stale_lock:
+            if key not in self.stale:
+                raise StorageUnavailable("storage unavailable and no cached result")
+            self.serving_stale = True
+            return self.stale[key]
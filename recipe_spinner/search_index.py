@@ -0,0 +1,166 @@
+import functools
+import heapq
+
+# fuzzy matches need at least this share of the query's bigrams
+FUZZY_THRESHOLD = 0.5
+
+# names whose search keys are kept, pinyin conversion is most of the cost of indexing a food
+SEARCH_KEYS_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=None)
+def _pinyin():
+    # imported on first use, pypinyin's dictionaries take a while to load
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:  # search still works on names without pinyin
+        return None
+    return lazy_pinyin, Style
+
+
+def normalize(text):
+    return ''.join(text.split()).lower()
+
+
+@functools.lru_cache(maxsize=SEARCH_KEYS_CACHE_SIZE)
+def search_keys(name):
+    """Strings a food can be found by: the name, full pinyin and pinyin initials"""
+    keys = [normalize(name)]
+    pinyin = _pinyin()
+    if pinyin is not None:
+        lazy_pinyin, Style = pinyin
+        syllables = [s.lower() for s in lazy_pinyin(name) if s.strip()]
+        initials = [s.lower() for s in lazy_pinyin(name, style=Style.FIRST_LETTER) if s.strip()]
+        keys.append(''.join(syllables))
+        keys.append(''.join(initials))
+    return tuple(key for key in dict.fromkeys(keys) if key)
+
+
+def bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+class TrieNode:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()
+
+
+class FoodSearchIndex:
+    """Prefix trie over names and pinyin with a bigram fallback for typos and infixes.
+
+    Entries are keyed by (category, food_name); every trie node keeps the
+    entries below it, so a prefix lookup costs only the length of the query.
+    """
+
+    def __init__(self, foods_by_category=None):
+        self.root = TrieNode()
+        self.grams = {}
+        self.foods = {}
+        for category, foods in (foods_by_category or {}).items():
+            for food in foods:
+                self.add(category, food)
+
+    def __len__(self):
+        return len(self.foods)
+
+    def add(self, category, food):
+        entry = (category, food.name)
+        self.foods[entry] = food
+        for key in search_keys(food.name):
+            node = self.root
+            for char in key:
+                node = node.children.setdefault(char, TrieNode())
+                node.entries.add(entry)
+            for gram in bigrams(key):
+                self.grams.setdefault(gram, set()).add(entry)
+
+    def remove(self, category, food_name):
+        entry = (category, food_name)
+        if self.foods.pop(entry, None) is None:
+            return
+        for key in search_keys(food_name):
+            node = self.root
+            for char in key:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                node.entries.discard(entry)
+            for gram in bigrams(key):
+                self.grams.get(gram, set()).discard(entry)
+
+    def _prefix(self, query):
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.entries
+
+    def ranked(self, query, limit=50):
+        """[(rank, entry)] for a normalized query, best first: prefix hits, then fuzzy bigram hits.
+        Ranks from different indexes compare, LayeredSearchIndex merges on them"""
+        # shortest names first, only the top `limit` are ordered
+        hits = heapq.nsmallest(limit, ((0, len(entry[1]), entry) for entry in self._prefix(query)))
+        if len(hits) < limit:
+            query_grams = bigrams(query)
+            scores = {}
+            for gram in query_grams:
+                for entry in self.grams.get(gram, ()):
+                    scores[entry] = scores.get(entry, 0) + 1
+            seen = {entry for *_, entry in hits}
+            fuzzy = (
+                (1, -score, len(entry[1]), entry) for entry, score in scores.items()
+                if entry not in seen and score / len(query_grams) >= FUZZY_THRESHOLD
+            )
+            hits += heapq.nsmallest(limit - len(hits), fuzzy)
+        return [(rank, rank[-1]) for rank in hits]
+
+    def search(self, query, limit=50):
+        """[(category, food)] best matches first: prefix hits, then fuzzy bigram hits"""
+        query = normalize(query)
+        if not query:
+            return []
+        return [(entry[0], self.foods[entry]) for _, entry in self.ranked(query, limit)]
+
+
+class LayeredSearchIndex:
+    """A shared read-only FoodSearchIndex plus one session's own changes.
+
+    The base (the system catalog) is built once per process and never
+    touched; adds go to a small local index and removes of base foods are
+    hidden. An added food that is also in the base hides the base copy.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.local = FoodSearchIndex()
+        self.hidden = set()
+
+    def __len__(self):
+        return len(self.base) - len(self.hidden) + len(self.local)
+
+    def add(self, category, food):
+        entry = (category, food.name)
+        if entry in self.base.foods:
+            self.hidden.add(entry)
+        self.local.add(category, food)
+
+    def remove(self, category, food_name):
+        entry = (category, food_name)
+        self.local.remove(category, food_name)
+        if entry in self.base.foods:
+            self.hidden.add(entry)
+
+    def search(self, query, limit=50):
+        query = normalize(query)
+        if not query:
+            return []
+        base = [hit for hit in self.base.ranked(query, limit + len(self.hidden)) if hit[1] not in self.hidden]
+        hits = heapq.nsmallest(limit, base + self.local.ranked(query, limit))
+        return [
+            (entry[0], self.local.foods[entry] if entry in self.local.foods else self.base.foods[entry])
+            for _, entry in hits
+        ]
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class SpinEngine:
+    """Weighted food picker over a {category: [food_name]} dict, e.g. Catalog.names.
+
+    All categories share one flat cumulative-weight table, so drawing N spins
+    for any set of categories is a single searchsorted call.
+    """
+
+    def __init__(self, names_by_category, recent_plans=None, recent_k=3, recent_penalty=0.2, weights=None):
+        # weights maps (category, food_name) to a per-food weight; missing foods weigh 1
+        # and 0 never gets picked. foods that showed up in the last k plans get their
+        # weight multiplied by recent_penalty (0 excludes them entirely)
+        food_weights = weights or {}
+        recent_counts = {}
+        for plan in (recent_plans or [])[:recent_k]:
+            for category, food in plan['食材'].items():
+                recent_counts[(category, food)] = recent_counts.get((category, food), 0) + 1
+
+        names = []
+        weights = []
+        counts = []
+        self.slices = {}
+        for category, food_names in names_by_category.items():
+            if not food_names:
+                continue
+            if food_weights:
+                base = np.array([float(food_weights.get((category, name), 1.0)) for name in food_names])
+            else:
+                base = np.ones(len(food_names))
+            if base.sum() <= 0:
+                continue  # every food weighs 0, nothing to pick from
+            seen = np.array([recent_counts.get((category, name), 0) for name in food_names])
+            adjusted = np.where(seen > 0, base * recent_penalty, base)
+            if adjusted.sum() <= 0:
+                # everything was picked recently, don't leave the category empty
+                adjusted = base
+
+            start = len(names)
+            names.extend(food_names)
+            weights.append(adjusted)
+            counts.append(seen)
+            self.slices[category] = (start, len(names))
+
+        self.names = np.array(names, dtype=object)
+        self.recent_counts = np.concatenate(counts) if counts else np.zeros(0)
+        self.weights = np.concatenate(weights) if weights else np.zeros(0)
+        self.cumulative = np.cumsum(self.weights)
+
+    def categories(self):
+        return list(self.slices)
+
+    def spin_indices(self, categories, n=1, rng=None):
+        """Draw n spins for every category, returns an (n, len(categories)) index array"""
+        rng = rng or np.random.default_rng()
+        categories = [c for c in categories if c in self.slices]
+        if not categories:
+            return np.zeros((n, 0), dtype=int), categories
+
+        bounds = np.array([self.slices[c] for c in categories])
+        starts, ends = bounds[:, 0], bounds[:, 1]
+        low = np.where(starts > 0, self.cumulative[starts - 1], 0.0)
+        high = self.cumulative[ends - 1]
+
+        targets = low + rng.random((n, len(categories))) * (high - low)
+        indices = np.searchsorted(self.cumulative, targets, side='right')
+        # float rounding can land exactly on the upper edge
+        return np.clip(indices, starts, ends - 1), categories
+
+    def spin(self, categories, n=1, rng=None):
+        """Draw n plans, each a {category: food_name} dict"""
+        indices, categories = self.spin_indices(categories, n, rng)
+        picked = self.names[indices]
+        return [dict(zip(categories, row)) for row in picked]
+
+    def spin_best_variety(self, categories, candidates=1000, rng=None):
+        """Draw many candidate plans and keep the one least overlapping recent plans"""
+        indices, categories = self.spin_indices(categories, candidates, rng)
+        if not categories:
+            return {}
+        scores = self.recent_counts[indices].sum(axis=1)
+        best = indices[int(np.argmin(scores))]
+        return dict(zip(categories, self.names[best]))
+
+    def spin_week(self, categories, days=7, meals=3, rng=None):
+        """Draw days * meals plans at once, in day order.
+
+        Every plan has one food per category. Within a category foods are
+        drawn without replacement, so nothing repeats until every food with
+        a non-zero weight has been used once.
+        """
+        rng = rng or np.random.default_rng()
+        categories = [c for c in categories if c in self.slices]
+        total = days * meals
+        columns = []
+        for category in categories:
+            start, end = self.slices[category]
+            weights = self.weights[start:end]
+            pool = np.flatnonzero(weights > 0) + start
+            p = self.weights[pool] / self.weights[pool].sum()
+            picks = []
+            while len(picks) < total:
+                size = min(len(pool), total - len(picks))
+                picks.extend(rng.choice(pool, size=size, replace=False, p=p))
+            columns.append(picks)
+        if not columns:
+            return []
+        picked = self.names[np.array(columns).T]
+        return [dict(zip(categories, row)) for row in picked]
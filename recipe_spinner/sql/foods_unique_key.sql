@@ -0,0 +1,24 @@
+-- Race-free dedupe for foods.
+--
+-- food_key is category|food_name after NFKC normalization (full-width ->
+-- half-width), with whitespace removed and lower-cased. The app computes it
+-- (storage.food_key) and writes through upsert(on_conflict='user_id,food_key',
+-- ignore_duplicates=True), so two sessions adding the same food can't both
+-- insert it.
+
+alter table foods add column if not exists food_key text;
+
+update foods
+set food_key = lower(regexp_replace(normalize(category || '|' || food_name, NFKC), '\s', '', 'g'))
+where food_key is null;
+
+-- keep the oldest row of any existing duplicates
+delete from foods a
+using foods b
+where a.user_id = b.user_id
+  and a.food_key = b.food_key
+  and a.id > b.id;
+
+alter table foods alter column food_key set not null;
+
+create unique index if not exists foods_user_food_key_idx on foods (user_id, food_key);
@@ -0,0 +1,10 @@
+-- Per-food spin weights.
+--
+-- A food with weight 2 comes up twice as often as one with weight 1, 0 keeps
+-- it in the catalog but out of the spins. Set through the weight column of a
+-- catalog_io import (python catalog_io.py import foods.csv).
+
+alter table foods add column if not exists weight real not null default 1;
+
+alter table foods drop constraint if exists foods_weight_check;
+alter table foods add constraint foods_weight_check check (weight >= 0);
@@ -0,0 +1,26 @@
+-- Store week_plans.foods_data as native jsonb instead of a json.dumps string.
+--
+-- Run once in the Supabase SQL editor. Legacy text rows are cast in place; if
+-- the column was already jsonb, rows written by the old app are json string
+-- scalars; rewrite them afterwards with
+--
+--     python catalog_io.py migrate-week-plans
+
+alter table week_plans
+    alter column foods_data type jsonb using foods_data::jsonb;
+
+-- "plans containing X" filters through PostgREST's cs (contains) operator
+create index if not exists week_plans_foods_data_idx
+    on week_plans using gin (foods_data jsonb_path_ops);
+
+-- how often a food was picked, counted in the database
+create or replace function food_pick_count(p_food_name text, p_user_id text default 'system')
+returns bigint
+language sql stable
+as $$
+    select count(*)
+    from week_plans, jsonb_each_text(foods_data) as item(category, food_name)
+    where week_plans.user_id = p_user_id
+      and jsonb_typeof(week_plans.foods_data) = 'object'
+      and item.food_name = p_food_name;
+$$;
@@ -0,0 +1,377 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+
+
+def food_key(category, food_name):
+    """Dedupe key for a food: NFKC (full-width -> half-width), no whitespace, lower case.
+
+    Stored in foods.food_key, which is unique per user_id.
+    """
+    text = unicodedata.normalize('NFKC', f'{category}|{food_name}')
+    return ''.join(text.split()).lower()
+
+
+class StorageBackend(abc.ABC):
+    """Row level operations DatabaseManager delegates to.
+
+    Rows are plain dicts shaped like the supabase `foods` and `week_plans`
+    tables. Methods raise on failure, DatabaseManager decides how to report it.
+    """
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def select_foods(self, user_ids, since=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def select_foods_page(self, user_ids, after_id=None, limit=1000):
+        """One page ordered by id, for streaming through the whole table"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_foods(self, user_ids):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def insert_foods(self, rows):
+        """Insert rows, skipping any whose (user_id, food_key) already exists.
+
+        Returns only the rows that were actually inserted.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_foods(self, user_id, food_ids=None):
+        """Delete the given ids owned by user_id, or all of user_id's foods"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def select_week_plans(self, user_id, before=None, since=None, limit=None):
+        """Newest first. `before` is a (created_at, id) keyset cursor"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_week_plans(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def insert_week_plans(self, rows):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_week_plans(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def find_week_plans_with_food(self, user_id, category, food_name):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_food_picks(self, user_id, food_name):
+        raise NotImplementedError
+
+    def migrate_week_plans(self, page_size):
+        # only the supabase table has legacy string rows
+        return 0
+
+
+class SupabaseBackend(StorageBackend):
+    name = 'supabase'
+
+    def __init__(self, client):
+        self.client = client
+
+    def select_foods(self, user_ids, since=None):
+        query = self.client.table('foods').select('*').in_('user_id', user_ids)
+        if since:
+            query = query.gte('created_at', since).order('created_at')
+        return query.execute().data
+
+    def select_foods_page(self, user_ids, after_id=None, limit=1000):
+        query = self.client.table('foods').select('*').in_('user_id', user_ids)
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        return query.order('id').limit(limit).execute().data
+
+    def count_foods(self, user_ids):
+        result = self.client.table('foods').select('id', count='exact').in_(
+            'user_id', user_ids
+        ).limit(1).execute()
+        return result.count
+
+    def insert_foods(self, rows):
+        # unique (user_id, food_key) makes this race free, see sql/foods_unique_key.sql
+        return self.client.table('foods').upsert(
+            rows, on_conflict='user_id,food_key', ignore_duplicates=True
+        ).execute().data
+
+    def delete_foods(self, user_id, food_ids=None):
+        query = self.client.table('foods').delete().eq('user_id', user_id)
+        if food_ids is not None:
+            query = query.in_('id', food_ids)
+        return query.execute().data
+
+    def select_week_plans(self, user_id, before=None, since=None, limit=None):
+        query = self.client.table('week_plans').select('*').eq('user_id', user_id)
+        if before:
+            created_at, plan_id = before
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{plan_id})')
+        if since:
+            query = query.gte('created_at', since)
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        if limit:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def count_week_plans(self, user_id):
+        result = self.client.table('week_plans').select('id', count='exact').eq(
+            'user_id', user_id
+        ).limit(1).execute()
+        return result.count
+
+    def insert_week_plans(self, rows):
+        return self.client.table('week_plans').insert(rows).execute().data
+
+    def delete_week_plans(self, user_id):
+        return self.client.table('week_plans').delete().eq('user_id', user_id).execute().data
+
+    def find_week_plans_with_food(self, user_id, category, food_name):
+        # jsonb containment, filtered server side
+        result = self.client.table('week_plans').select('*').eq(
+            'user_id', user_id
+        ).contains('foods_data', {category: food_name}).order('created_at', desc=True).execute()
+        return result.data
+
+    def count_food_picks(self, user_id, food_name):
+        result = self.client.rpc('food_pick_count', {
+            'p_food_name': food_name, 'p_user_id': user_id
+        }).execute()
+        return result.data
+
+    def migrate_week_plans(self, page_size):
+        # rows written before the jsonb switch hold a json.dumps string
+        migrated = 0
+        last_id = None
+        while True:
+            query = self.client.table('week_plans').select('*')
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.order('id').limit(page_size).execute().data
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            legacy = [dict(item, foods_data=json.loads(item['foods_data']))
+                      for item in rows if isinstance(item['foods_data'], str)]
+            if legacy:
+                self.client.table('week_plans').upsert(legacy).execute()
+                migrated += len(legacy)
+        return migrated
+
+
+SQLITE_SCHEMA = """
+create table if not exists foods (
+    id integer primary key autoincrement,
+    user_id text not null,
+    category text not null,
+    food_name text not null,
+    food_key text,
+    weight real not null default 1,
+    created_at text
+);
+create index if not exists foods_user_category_name_idx on foods (user_id, category, food_name);
+create index if not exists foods_created_at_idx on foods (created_at);
+
+create table if not exists week_plans (
+    id integer primary key autoincrement,
+    user_id text not null,
+    plan_date text,
+    plan_time text,
+    foods_data text not null,
+    created_at text
+);
+create index if not exists week_plans_user_created_idx on week_plans (user_id, created_at, id);
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    """Local single-node storage, foods_data is kept as json text and decoded on read"""
+
+    name = 'sqlite'
+
+    def __init__(self, path='recipe_spinner.db'):
+        # streamlit serves sessions from several threads, one connection behind a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SQLITE_SCHEMA)
+            self._migrate_food_keys()
+            self._migrate_weights()
+
+    def _migrate_food_keys(self):
+        # databases created before food_key existed get the column backfilled,
+        # keeping the oldest row of any duplicates
+        columns = {row['name'] for row in self.conn.execute("pragma table_info(foods)")}
+        if 'food_key' not in columns:
+            self.conn.execute("alter table foods add column food_key text")
+        missing = self.conn.execute("select id, user_id, category, food_name from foods where food_key is null order by id")
+        seen = set()
+        for row in missing.fetchall():
+            key = food_key(row['category'], row['food_name'])
+            if (row['user_id'], key) in seen:
+                self.conn.execute("delete from foods where id = ?", (row['id'],))
+                continue
+            seen.add((row['user_id'], key))
+            self.conn.execute("update foods set food_key = ? where id = ?", (key, row['id']))
+        self.conn.execute("create unique index if not exists foods_user_food_key_idx on foods (user_id, food_key)")
+
+    def _migrate_weights(self):
+        # per-food spin weights, see sql/foods_weight.sql
+        columns = {row['name'] for row in self.conn.execute("pragma table_info(foods)")}
+        if 'weight' not in columns:
+            self.conn.execute("alter table foods add column weight real not null default 1")
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def _execute(self, sql, params=()):
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    @staticmethod
+    def _placeholders(values):
+        return ','.join('?' * len(values))
+
+    def select_foods(self, user_ids, since=None):
+        sql = f"select * from foods where user_id in ({self._placeholders(user_ids)})"
+        params = list(user_ids)
+        if since:
+            sql += " and created_at >= ? order by created_at"
+            params.append(since)
+        return self._query(sql, params)
+
+    def select_foods_page(self, user_ids, after_id=None, limit=1000):
+        return self._query(
+            f"select * from foods where user_id in ({self._placeholders(user_ids)}) "
+            f"and id > ? order by id limit ?",
+            [*user_ids, after_id if after_id is not None else -1, limit]
+        )
+
+    def count_foods(self, user_ids):
+        rows = self._query(
+            f"select count(*) as n from foods where user_id in ({self._placeholders(user_ids)})", user_ids
+        )
+        return rows[0]['n']
+
+    def insert_foods(self, rows):
+        inserted = []
+        with self.lock, self.conn:
+            for row in rows:
+                key = row.get('food_key') or food_key(row['category'], row['food_name'])
+                cursor = self.conn.execute(
+                    "insert or ignore into foods (user_id, category, food_name, food_key, weight, created_at) "
+                    "values (?, ?, ?, ?, ?, ?)",
+                    (row['user_id'], row['category'], row['food_name'], key,
+                     1.0 if row.get('weight') is None else row['weight'], row.get('created_at'))
+                )
+                if cursor.rowcount:
+                    inserted.append(dict(row, food_key=key, id=cursor.lastrowid))
+        return inserted
+
+    def delete_foods(self, user_id, food_ids=None):
+        if food_ids is None:
+            self._execute("delete from foods where user_id = ?", (user_id,))
+        else:
+            self._execute(
+                f"delete from foods where user_id = ? and id in ({self._placeholders(food_ids)})",
+                [user_id, *food_ids]
+            )
+
+    def _decode_plans(self, rows):
+        for item in rows:
+            item['foods_data'] = json.loads(item['foods_data'])
+        return rows
+
+    def select_week_plans(self, user_id, before=None, since=None, limit=None):
+        sql = "select * from week_plans where user_id = ?"
+        params = [user_id]
+        if before:
+            created_at, plan_id = before
+            sql += " and (created_at < ? or (created_at = ? and id < ?))"
+            params += [created_at, created_at, plan_id]
+        if since:
+            sql += " and created_at >= ?"
+            params.append(since)
+        sql += " order by created_at desc, id desc"
+        if limit:
+            sql += " limit ?"
+            params.append(limit)
+        return self._decode_plans(self._query(sql, params))
+
+    def count_week_plans(self, user_id):
+        return self._query("select count(*) as n from week_plans where user_id = ?", (user_id,))[0]['n']
+
+    def insert_week_plans(self, rows):
+        inserted = []
+        with self.lock, self.conn:
+            for row in rows:
+                cursor = self.conn.execute(
+                    "insert into week_plans (user_id, plan_date, plan_time, foods_data, created_at) "
+                    "values (?, ?, ?, ?, ?)",
+                    (row['user_id'], row['plan_date'], row['plan_time'],
+                     json.dumps(row['foods_data'], ensure_ascii=False), row.get('created_at'))
+                )
+                inserted.append(dict(row, id=cursor.lastrowid))
+        return inserted
+
+    def delete_week_plans(self, user_id):
+        self._execute("delete from week_plans where user_id = ?", (user_id,))
+
+    def find_week_plans_with_food(self, user_id, category, food_name):
+        return self._decode_plans(self._query(
+            "select * from week_plans where user_id = ? and json_extract(foods_data, '$.\"' || ? || '\"') = ? "
+            "order by created_at desc, id desc",
+            (user_id, category, food_name)
+        ))
+
+    def count_food_picks(self, user_id, food_name):
+        rows = self._query(
+            "select count(*) as n from week_plans, json_each(week_plans.foods_data) "
+            "where week_plans.user_id = ? and json_each.value = ?",
+            (user_id, food_name)
+        )
+        return rows[0]['n']
+
+
+class MemoryBackend(SQLiteBackend):
+    """Throwaway in-process storage for tests, benchmarks and offline demos"""
+
+    name = 'memory'
+
+    def __init__(self):
+        super().__init__(':memory:')
+
+
+def create_storage(config, supabase_factory=None):
+    """Pick a backend from config (st.secrets or a plain dict).
+
+    STORAGE_BACKEND is one of supabase (default), sqlite or memory;
+    SQLITE_PATH sets the database file for the sqlite backend. Both fall
+    back to environment variables of the same name.
+    """
+    backend = config.get('STORAGE_BACKEND') or os.environ.get('STORAGE_BACKEND', 'supabase')
+    if backend == 'sqlite':
+        return SQLiteBackend(config.get('SQLITE_PATH') or os.environ.get('SQLITE_PATH', 'recipe_spinner.db'))
+    if backend == 'memory':
+        return MemoryBackend()
+    if backend == 'supabase':
+        client = supabase_factory() if supabase_factory else None
+        return SupabaseBackend(client) if client else None
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,148 @@
+import queue
+import random
+import threading
+import time
+
+from resilience import is_transient
+
+# kinds that can run twice without doubling anything: the foods insert is an upsert on
+# (user_id, food_key) and deletes are by id. a week plan insert that failed on a timeout
+# may still have landed, so it isn't retried automatically
+IDEMPOTENT_KINDS = frozenset({'insert_foods', 'delete_foods'})
+
+
+class PendingWrite:
+    """One queued storage call, kind is the StorageBackend method to run"""
+
+    __slots__ = ('kind', 'payload', 'owner', 'status', 'error')
+
+    def __init__(self, kind, payload, owner):
+        self.kind = kind  # 'insert_foods' | 'delete_foods' | 'insert_week_plans'
+        self.payload = payload  # rows to insert, or food ids to delete
+        self.owner = owner
+        self.status = 'pending'
+        self.error = None
+
+
+class WriteBehindQueue:
+    """Background writer for optimistic UI updates.
+
+    Writes submitted within flush_interval of each other are coalesced into one
+    storage call per kind. When a coalesced call fails each session's writes
+    are retried on their own with jittered exponential backoff before being
+    parked in `failed` for a manual retry. Kinds outside IDEMPOTENT_KINDS run
+    once, and are only split per session when the backend rejected the call
+    outright, since a single insert either lands whole or not at all.
+    """
+
+    def __init__(self, storage, flush_interval=0.5, max_batch=200, max_attempts=4,
+                 base_delay=0.5, on_flush=None):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.on_flush = on_flush
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.failed = []
+        self.worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self.worker.start()
+
+    def submit(self, kind, payload, owner):
+        write = PendingWrite(kind, payload, owner)
+        with self.lock:
+            self.pending.append(write)
+        self.queue.put(write)
+        return write
+
+    def status(self, owner):
+        """(pending, failed) writes for one session"""
+        with self.lock:
+            return ([w for w in self.pending if w.owner == owner],
+                    [w for w in self.failed if w.owner == owner])
+
+    def retry_failed(self, owner):
+        with self.lock:
+            writes = [w for w in self.failed if w.owner == owner]
+            self.failed = [w for w in self.failed if w.owner != owner]
+            for write in writes:
+                write.status = 'pending'
+                write.error = None
+            self.pending.extend(writes)
+        for write in writes:
+            self.queue.put(write)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # give a burst of edits a moment to pile up so it coalesces
+            time.sleep(self.flush_interval)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        groups = {}
+        for write in batch:
+            # deletes are scoped to their owner, inserts carry user_id in the rows
+            key = (write.kind, write.owner if write.kind == 'delete_foods' else None)
+            groups.setdefault(key, []).append(write)
+
+        for (kind, owner), writes in groups.items():
+            self._write_group(kind, owner, writes)
+        if self.on_flush:
+            self.on_flush()
+
+    def _write_group(self, kind, owner, writes):
+        sessions = {write.owner for write in writes}
+        if len(sessions) == 1:
+            self._write_with_retries(kind, owner, writes)
+            return
+        # one coalesced call first; if it fails each session's rows are retried on
+        # their own, so one session's bad rows don't fail everyone else's writes
+        try:
+            self._apply(kind, owner, writes)
+        except Exception as e:
+            if kind not in IDEMPOTENT_KINDS and is_transient(e):
+                self._finish(writes, 'failed', e)
+                return
+            for session in sessions:
+                self._write_with_retries(kind, owner, [w for w in writes if w.owner == session])
+        else:
+            self._finish(writes, 'done')
+
+    def _write_with_retries(self, kind, owner, writes):
+        error = None
+        attempts = self.max_attempts if kind in IDEMPOTENT_KINDS else 1
+        for attempt in range(attempts):
+            try:
+                self._apply(kind, owner, writes)
+                self._finish(writes, 'done')
+                return
+            except Exception as e:
+                error = e
+                if attempt + 1 < attempts:
+                    time.sleep(self.base_delay * (2 ** attempt) * (1 + random.random()))
+        self._finish(writes, 'failed', error)
+
+    def _apply(self, kind, owner, writes):
+        payload = [item for write in writes for item in write.payload]
+        if kind == 'delete_foods':
+            self.storage.delete_foods(owner, payload)
+        else:
+            getattr(self.storage, kind)(payload)
+
+    def _finish(self, writes, status, error=None):
+        with self.lock:
+            for write in writes:
+                write.status = status
+                write.error = error
+            done = set(map(id, writes))
+            self.pending = [w for w in self.pending if id(w) not in done]
+            if status == 'failed':
+                self.failed.extend(writes)